@@ -0,0 +1,419 @@
+import numpy as np
+import pandas as pd
+
+from approximate import StratifiedSample
+from cube import GROUP, build_cube, cube_answers, filter_cube, merge_cubes, summarize_cube
+from data_cache import load_cached
+from distinct import SKETCH_ROWS, DistinctIndex, SketchCube, count_deltas, group_labels, order_kpis
+from filter_engine import DIMENSION_FILTERS, FilterEngine
+from parallel import DEFAULT_WORKERS, parallel_cube, parallel_select
+from search_index import SearchIndex
+from sort_index import SortIndex
+from timeseries import COMPARISON_MODES, DEFAULT_COMPARISON, DailySeries
+
+# Headless analytics core
+#
+# Everything the dashboard computes, as plain functions over a Dataset handle
+# and a filter dict, so it can run without a Streamlit session. A filter dict
+# may hold any of:
+#
+#   date_range      (start, end) dates, inclusive
+#   regions         list of Region values
+#   categories      list of Category values
+#   segments        list of Segment values
+#   ship_modes      list of Ship Mode values
+#   states          list of State values
+#   sub_categories  list of Sub-Category values
+#   sales_range     (low, high) Sales bounds, inclusive
+#
+# Missing keys do not filter. Filters on dates, Region, Category and Segment
+# are answered from the cube; a Sales range or any other dimension needs the
+# rows and goes through the filter engine.
+#
+# KPI deltas compare the selected window with another window (see
+# timeseries.COMPARISON_MODES) over a daily prefix-sum series of the selection
+# with its date range lifted, so earlier periods are in reach.
+#
+# Orders, customers and products are distinct counts of their IDs (see
+# distinct.py): exact on the integer-coded IDs, or from the sketch cube on
+# data of SKETCH_ROWS rows or more when the cube answers the filters. Total
+# Orders and Avg Order Value are per distinct order; data without an Order ID
+# keeps counting rows.
+
+FILTER_KEYS = ("date_range", *DIMENSION_FILTERS, "sales_range")
+
+
+class Dataset:
+    """A loaded sales frame plus its lazily built cube, filter engine, search index,
+    sort orders, stratified sample (for approximate answers) and distinct-count
+    index and sketches.
+
+    With workers > 1 cubes are built per date partition, and rows selected per
+    row range, on a worker pool.
+    appended carries the built cube, engine, distinct index and sort orders over
+    to a frame with rows appended.
+    """
+
+    def __init__(self, df, key=None, workers=None):
+        self.df = df
+        self.key = key
+        self.workers = workers or DEFAULT_WORKERS
+        self._cube = None
+        self._engine = None
+        self._search_index = None
+        self._sort_index = None
+        self._sample = None
+        self._distinct = None
+        self._sketches = None
+
+    def appended(self, df, key=None):
+        """A Dataset of df, this frame with rows appended, whose cube, filter engine,
+        distinct index and sort orders (those built so far) are extended with the new
+        rows; the search index, sample and sketches are built on first use."""
+        new_rows = df.iloc[len(self.df):]
+        dataset = Dataset(df, key, self.workers)
+        if self._cube is not None:
+            dataset._cube = merge_cubes([self._cube, build_cube(new_rows)])
+        if self._engine is not None:
+            dataset._engine = self._engine.appended(new_rows)
+        if self._distinct is not None:
+            dataset._distinct = self._distinct.appended(new_rows)
+        if self._sort_index is not None:
+            dataset._sort_index = self._sort_index.appended(df)
+        return dataset
+
+    @property
+    def cube(self):
+        if self._cube is None:
+            self._cube = self.build_cube()
+        return self._cube
+
+    def build_cube(self, rows=None):
+        if self.workers > 1:
+            return parallel_cube(self.df, rows, self.workers)
+        return build_cube(self.df if rows is None else self.df.iloc[rows])
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = FilterEngine(self.df)
+        return self._engine
+
+    @property
+    def search_index(self):
+        if self._search_index is None:
+            self._search_index = SearchIndex(self.df)
+        return self._search_index
+
+    @property
+    def sort_index(self):
+        if self._sort_index is None:
+            self._sort_index = SortIndex(self.df)
+        return self._sort_index
+
+    @property
+    def sample(self):
+        if self._sample is None:
+            self._sample = StratifiedSample(self.df)
+        return self._sample
+
+    @property
+    def distinct(self):
+        if self._distinct is None:
+            self._distinct = DistinctIndex(self.df)
+        return self._distinct
+
+    @property
+    def sketches(self):
+        if self._sketches is None:
+            self._sketches = SketchCube(self.df, self.distinct)
+        return self._sketches
+
+
+def load_dataset(path, workers=None):
+    df, key = load_cached(path)
+    return Dataset(df, key, workers)
+
+
+def filter_key(filters):
+    """Hashable, order-independent form of a filter dict, for memoization."""
+    key = []
+    for name in FILTER_KEYS:
+        value = filters.get(name)
+        if value is not None and name in DIMENSION_FILTERS:
+            value = tuple(sorted(map(str, value)))
+        elif value is not None:
+            value = tuple(str(v) if name == "date_range" else float(v) for v in value)
+        key.append(value)
+    return tuple(key)
+
+
+def _dimension_filters(filters):
+    return {dim: filters[key] for key, dim in DIMENSION_FILTERS.items() if filters.get(key) is not None}
+
+
+def select_rows(dataset, filters):
+    engine = dataset.engine
+    date_range = filters.get("date_range")
+    base = engine.date_bitmap(tuple(date_range) if date_range is not None else None)
+    if dataset.workers > 1:
+        return parallel_select(engine, base, _dimension_filters(filters), filters.get("sales_range"), dataset.workers)
+    return engine.select(base, _dimension_filters(filters), filters.get("sales_range"))
+
+
+def aggregates(dataset, filters, rows=None, comparison=DEFAULT_COMPARISON):
+    """KPIs and chart tables for a filter set; None when nothing matches.
+
+    With comparison=None the deltas are left as summarize_cube computes them.
+    """
+    if cube_answers(filters):
+        aggs = summarize_cube(filter_cube(
+            dataset.cube,
+            filters.get("date_range"),
+            filters.get("regions"),
+            filters.get("categories"),
+            filters.get("segments"),
+        ))
+    else:
+        if rows is None:
+            rows = select_rows(dataset, filters)
+        if len(rows) == 0:
+            return None
+        aggs = summarize_cube(dataset.build_cube(rows))
+    if aggs is None:
+        return None
+    aggs["kpis"] = order_kpis(aggs["kpis"], distinct_counts(dataset, filters, rows))
+    if comparison is not None:
+        series = daily_series(dataset, filters)
+        aggs["kpis"].update(compare_periods(dataset, filters, comparison, series))
+        aggs["kpis"].update(distinct_deltas(dataset, filters, comparison, series))
+    return aggs
+
+
+def daily_series(dataset, filters):
+    """Prefix-sum series of the selection over all dates (date_range is ignored)."""
+    if cube_answers(filters):
+        return DailySeries.from_cube(filter_cube(
+            dataset.cube,
+            None,
+            filters.get("regions"),
+            filters.get("categories"),
+            filters.get("segments"),
+        ))
+    rows = select_rows(dataset, dict(filters, date_range=None))
+    return DailySeries.from_frame(dataset.df.iloc[rows])
+
+
+def compare_periods(dataset, filters, mode=DEFAULT_COMPARISON, series=None):
+    if mode not in COMPARISON_MODES:
+        raise ValueError(f"Unknown comparison mode: {mode!r}")
+    if series is None:
+        series = daily_series(dataset, filters)
+    return series.compare(mode, filters.get("date_range"))
+
+
+def distinct_counts(dataset, filters, rows=None):
+    """Distinct orders, customers and products of a selection, e.g. {"orders": 5009, ...,
+    "estimated": False}.
+
+    Exact, unless the data has SKETCH_ROWS rows or more and the cube answers the
+    filters: then estimated from the sketch cube, and "estimated" is True.
+    """
+    if len(dataset.df) >= SKETCH_ROWS and cube_answers(filters):
+        return dict(dataset.sketches.count(filters, _day_rows(dataset, filters)), estimated=True)
+    if rows is None:
+        rows = select_rows(dataset, filters)
+    return dict(dataset.distinct.count(rows), estimated=False)
+
+
+def _day_rows(dataset, filters):
+    return lambda date_range: select_rows(dataset, dict(filters, date_range=date_range))
+
+
+def distinct_deltas(dataset, filters, mode=DEFAULT_COMPARISON, series=None):
+    """Percent change of distinct orders and customers over the comparison window
+    of mode; None when that window holds none."""
+    if series is None:
+        series = daily_series(dataset, filters)
+    if len(series) == 0 or not dataset.distinct.codes:
+        return {}
+    current_window, previous_window = series.windows(mode, filters.get("date_range"))
+    current = distinct_counts(dataset, dict(filters, date_range=current_window))
+    previous = distinct_counts(dataset, dict(filters, date_range=previous_window))
+    return count_deltas(current, previous)
+
+
+def distinct_by(dataset, filters, by, rows=None):
+    """Orders, customers, products and Sales per value of by ("Region", "Category" or
+    "Month"), with per-customer Sales and orders; counted like distinct_counts."""
+    if len(dataset.df) >= SKETCH_ROWS and cube_answers(filters):
+        labels, counts = dataset.sketches.count(filters, _day_rows(dataset, filters), by)
+        cube = filter_cube(
+            dataset.cube, filters.get("date_range"),
+            filters.get("regions"), filters.get("categories"), filters.get("segments"),
+        )
+        keys = cube["Order Date"].dt.strftime("%Y-%m") if by == "Month" else cube[by].astype(str)
+        sales = cube["Sales"].groupby(keys.to_numpy()).sum().reindex(labels, fill_value=0).to_numpy()
+    else:
+        if rows is None:
+            rows = select_rows(dataset, filters)
+        groups, labels = pd.factorize(group_labels(dataset.df, rows, by), sort=True)
+        counts = dataset.distinct.count_by(rows, groups, len(labels))
+        sales = np.bincount(groups, dataset.df["Sales"].to_numpy(np.float64)[rows], minlength=len(labels))
+    table = pd.DataFrame({by: labels})
+    for name, column in [("orders", "Orders"), ("customers", "Customers"), ("products", "Products")]:
+        if name in counts:
+            table[column] = counts[name]
+    table["Sales"] = sales
+    if "Customers" in table:
+        customers = table["Customers"].where(table["Customers"] > 0)
+        table["Sales per Customer"] = table["Sales"] / customers
+        if "Orders" in table:
+            table["Orders per Customer"] = table["Orders"] / customers
+    return table
+
+
+def kpis(dataset, filters):
+    aggs = aggregates(dataset, filters)
+    return aggs["kpis"] if aggs is not None else None
+
+
+def regional_performance(dataset, filters):
+    aggs = aggregates(dataset, filters)
+    return aggs["regional_performance"] if aggs is not None else None
+
+
+def describe_selection(dataset, rows):
+    values = dataset.df.iloc[rows][['Sales', 'Profit', 'Discount']]
+    stats_df = values.describe()
+    avg_discount_profitable = values[values['Profit'] > 0]['Discount'].mean() * 100
+    return stats_df, avg_discount_profitable
+
+
+def key_insights(dataset, filters, aggs=None, rows=None):
+    if aggs is None:
+        aggs = aggregates(dataset, filters)
+    if rows is None:
+        rows = select_rows(dataset, filters)
+    _, avg_discount_profitable = describe_selection(dataset, rows)
+    return {
+        "best_region": aggs["best_region"],
+        "best_category": aggs["best_category"],
+        "avg_discount_profitable": avg_discount_profitable,
+        "transactions": len(rows),
+        "profit_margin": aggs["kpis"]["profit_margin"],
+    }
+
+
+def _plain(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def summarize(dataset, filters, comparison=DEFAULT_COMPARISON):
+    """JSON-ready KPIs, insights and regional table for one filter set."""
+    rows = select_rows(dataset, filters)
+    if len(rows) == 0:
+        return None
+    aggs = aggregates(dataset, filters, rows, comparison)
+    return _summary(aggs, key_insights(dataset, filters, aggs, rows))
+
+
+def _summary(aggs, insights):
+    return {
+        "kpis": {k: _plain(v) for k, v in aggs["kpis"].items()},
+        "insights": {k: _plain(v) for k, v in insights.items()},
+        "regional_performance": [
+            {k: _plain(v) for k, v in record.items()}
+            for record in aggs["regional_performance"].to_dict("records")
+        ],
+    }
+
+
+def summarize_many(dataset, filter_sets, comparison=DEFAULT_COMPARISON):
+    """Summaries for many named filter sets over one loaded, indexed dataset, as
+    summarize gives them (with exact distinct counts).
+
+    Sets the cube answers are summarized from it. The others share one cube,
+    grouped by set and built in one pass over the rows of all of them with the
+    date range lifted, which also gives their daily series. Distinct counts
+    and insights of every set come from one more pass over all selected rows.
+    """
+    selections = {name: select_rows(dataset, filters) for name, filters in filter_sets.items()}
+    names = [name for name, rows in selections.items() if len(rows) > 0]
+
+    scanned = [name for name in names if not cube_answers(filter_sets[name])]
+    if scanned:
+        lifted = [select_rows(dataset, dict(filter_sets[name], date_range=None)) for name in scanned]
+        grouped = build_cube(
+            dataset.df.iloc[np.concatenate(lifted)],
+            groups=np.repeat(np.arange(len(scanned)), [len(rows) for rows in lifted]),
+        )
+        set_cubes = {scanned[i]: cube.drop(columns=GROUP) for i, cube in grouped.groupby(GROUP, sort=False)}
+
+    # Row ids of each selection and, for the distinct-count deltas, of its two
+    # comparison windows, tagged with one group per (set, part)
+    aggs, series, parts = {}, {}, []
+    for name in names:
+        filters = filter_sets[name]
+        if name in scanned:
+            series[name] = DailySeries.from_cube(set_cubes[name])
+            cube = filter_cube(set_cubes[name], filters.get("date_range"))
+        else:
+            series[name] = daily_series(dataset, filters)
+            cube = filter_cube(
+                dataset.cube, filters.get("date_range"),
+                filters.get("regions"), filters.get("categories"), filters.get("segments"),
+            )
+        aggs[name] = summarize_cube(cube)
+        parts.append(selections[name])
+        if comparison is not None and len(series[name]) > 0:
+            for window in series[name].windows(comparison, filters.get("date_range")):
+                parts.append(select_rows(dataset, dict(filters, date_range=window)))
+        else:
+            parts += [np.empty(0, dtype=np.int64)] * 2
+
+    rows = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+    groups = np.repeat(np.arange(len(parts)), [len(part) for part in parts])
+    counts = dataset.distinct.count_by(rows, groups, len(parts))
+    profit = dataset.df["Profit"].to_numpy(np.float64)[rows] > 0
+    discount = dataset.df["Discount"].to_numpy(np.float64)[rows]
+    profitable = np.bincount(groups[profit], minlength=len(parts))
+    profitable_discount = np.bincount(groups[profit], discount[profit], minlength=len(parts))
+
+    results = dict.fromkeys(filter_sets)
+    for i, name in enumerate(names):
+        filters = filter_sets[name]
+        selected, current, previous = ({key: int(c[3 * i + part]) for key, c in counts.items()} for part in range(3))
+        kpis = order_kpis(aggs[name]["kpis"], dict(selected, estimated=False))
+        if comparison is not None:
+            kpis.update(series[name].compare(comparison, filters.get("date_range")))
+            if len(series[name]) > 0:
+                kpis.update(count_deltas(current, previous))
+        aggs[name]["kpis"] = kpis
+        with np.errstate(invalid="ignore", divide="ignore"):
+            avg_discount_profitable = profitable_discount[3 * i] / profitable[3 * i] * 100
+        results[name] = _summary(aggs[name], {
+            "best_region": aggs[name]["best_region"],
+            "best_category": aggs[name]["best_category"],
+            "avg_discount_profitable": avg_discount_profitable,
+            "transactions": len(selections[name]),
+            "profit_margin": kpis["profit_margin"],
+        })
+    return results
+
+
+def summaries_to_frames(results):
+    """Flatten summarize_many output into KPI and regional tables keyed by filter set."""
+    kpi_rows = []
+    regional_rows = []
+    for name, summary in results.items():
+        if summary is None:
+            continue
+        kpi_rows.append({"filter_set": name, **summary["kpis"], **summary["insights"]})
+        for record in summary["regional_performance"]:
+            regional_rows.append({"filter_set": name, **record})
+    return pd.DataFrame(kpi_rows), pd.DataFrame(regional_rows)
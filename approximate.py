@@ -0,0 +1,249 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cube import build_cube, cube_answers, filter_cube, summarize_cube
+from filter_engine import DIMENSION_FILTERS
+from timeseries import DEFAULT_COMPARISON, DailySeries
+
+# Approximate answers from a stratified sample
+#
+# A fixed fraction of the rows of every Region x Category x month stratum (at
+# least MIN_STRATUM_ROWS, or the whole stratum when smaller) is drawn once per
+# dataset; on large data the fraction shrinks so the sample stays around
+# SAMPLE_ROWS rows and an estimate costs the same at any scale. Each sampled
+# row carries its stratum's expansion weight N_h / n_h, so a weighted cube of
+# the sample answers the same filters as the full cube, with estimates of
+# every KPI and chart table, at a fraction of the cost.
+#
+# Intervals are the textbook stratified-sampling ones: the variance of an
+# estimated total sums N_h^2 (1 - n_h / N_h) s_h^2 / n_h over the strata, rows
+# outside the filter counting as zero. Ratios (margin, averages) use the
+# linearised variance of Y - R X. Quantiles in the statistical summary are
+# weighted sample quantiles, i.e. the sample doubles as a quantile sketch.
+#
+# BackgroundResults runs the exact computation for a filter state on a small
+# thread pool, so a page can draw the estimates first and swap in the exact
+# results once they are ready.
+
+SAMPLE_FRACTION = 0.05
+SAMPLE_ROWS = 100_000
+MIN_STRATUM_ROWS = 5
+SAMPLE_SEED = 0
+STRATUM_COLUMNS = ["Region", "Category"]
+SAMPLE_COLUMNS = [
+    "Order Date", "Region", "State", "City", "Category", "Sub-Category", "Segment", "Ship Mode",
+    "Sales", "Profit", "Discount",
+]
+DESCRIBE_COLUMNS = ["Sales", "Profit", "Discount"]
+CONFIDENCE_Z = 1.96  # 95% intervals
+HISTOGRAM_BINS = 30
+
+
+def weighted_quantiles(values, weights, quantiles):
+    order = np.argsort(values)
+    values, weights = values[order], weights[order]
+    cumulative = np.cumsum(weights)
+    positions = (cumulative - 0.5 * weights) / cumulative[-1]
+    return np.interp(quantiles, positions, values)
+
+
+class StratifiedSample:
+    def __init__(self, df, fraction=None, min_rows=MIN_STRATUM_ROWS, seed=SAMPLE_SEED):
+        if fraction is None:
+            fraction = min(SAMPLE_FRACTION, SAMPLE_ROWS / max(len(df), 1))
+        keys = [df[c] for c in STRATUM_COLUMNS if c in df.columns]
+        keys.append(df["Order Date"].dt.to_period("M"))
+        strata = df.groupby(keys, observed=True, sort=False, dropna=False).ngroup().to_numpy()
+        population = np.bincount(strata)
+        taken = np.minimum(population, np.maximum(min_rows, np.ceil(fraction * population))).astype(np.int64)
+
+        # Random rank of each row within its stratum; the first n_h are kept
+        order = np.random.default_rng(seed).permutation(len(df))
+        rank = pd.Series(strata[order]).groupby(strata[order]).cumcount().to_numpy()
+        positions = np.sort(order[rank < taken[strata[order]]])
+
+        self.population_rows = len(df)
+        self.positions = positions
+        self.strata = strata[positions]
+        self.population = population.astype(np.float64)
+        self.taken = taken.astype(np.float64)
+        self.weights = (self.population / self.taken)[self.strata]
+        self.rows = df.iloc[positions][[c for c in SAMPLE_COLUMNS if c in df.columns]].reset_index(drop=True)
+        self.days = self.rows["Order Date"].dt.normalize()
+        # (codes, distinct labels) of the chart groups, matched to a table's labels per estimate
+        self.groups = {
+            "Category": pd.factorize(self.rows["Category"].astype(str)),
+            "Region": pd.factorize(self.rows["Region"].astype(str)),
+            "Month": pd.factorize(self.rows["Order Date"].dt.to_period("M").astype(str)),
+        }
+        self._cube = None
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def cube(self):
+        if self._cube is None:
+            self._cube = build_cube(self.rows, self.weights)
+        return self._cube
+
+    def mask(self, filters):
+        rows = self.rows
+        mask = np.ones(len(rows), dtype=bool)
+        date_range = filters.get("date_range")
+        if date_range is not None:
+            day = self.days
+            mask &= ((day >= pd.Timestamp(date_range[0])) & (day <= pd.Timestamp(date_range[1]))).to_numpy()
+        for key, column in DIMENSION_FILTERS.items():
+            if filters.get(key) is not None and column in rows.columns:
+                mask &= rows[column].isin(filters[key]).to_numpy()
+        sales_range = filters.get("sales_range")
+        if sales_range is not None:
+            mask &= ((rows["Sales"] >= sales_range[0]) & (rows["Sales"] <= sales_range[1])).to_numpy()
+        return mask
+
+    def _selection_cube(self, filters):
+        # Same split as analytics.aggregates: the sample cube answers unless a
+        # Sales range or a dimension outside the cube needs the sampled rows
+        if cube_answers(filters):
+            return filter_cube(
+                self.cube, filters.get("date_range"),
+                filters.get("regions"), filters.get("categories"), filters.get("segments"),
+            )
+        keep = self.mask(filters)
+        return build_cube(self.rows[keep], self.weights[keep])
+
+    # Intervals
+
+    def _half_widths(self, z, groups=None, n_groups=1):
+        # Interval half-width of the estimated total of z (zero outside the
+        # filter) within each group, from one pass over the sample
+        n_strata = len(self.population)
+        index = self.strata if groups is None else self.strata * n_groups + groups
+        sums = np.bincount(index, z, minlength=n_strata * n_groups).reshape(n_strata, n_groups)
+        squares = np.bincount(index, z * z, minlength=n_strata * n_groups).reshape(n_strata, n_groups)
+        n, N = self.taken[:, None], self.population[:, None]
+        s2 = np.where(n > 1, (squares - sums ** 2 / n) / np.maximum(n - 1, 1), 0.0)
+        variance = np.sum(N ** 2 * (1 - n / N) * s2 / n, axis=0)
+        return CONFIDENCE_Z * np.sqrt(np.maximum(variance, 0.0))
+
+    def _half_width(self, z):
+        return float(self._half_widths(z)[0])
+
+    def _ratio_half_width(self, y, x):
+        x_total = np.dot(self.weights, x)
+        if x_total == 0:
+            return 0.0
+        ratio = np.dot(self.weights, y) / x_total
+        return self._half_width((y - ratio * x) / x_total)
+
+    def kpi_intervals(self, keep):
+        """95% interval half-widths for the KPI estimates of a filter mask."""
+        keep = keep.astype(np.float64)
+        sales = self.rows["Sales"].to_numpy(np.float64) * keep
+        profit = self.rows["Profit"].to_numpy(np.float64) * keep
+        discount = self.rows["Discount"].to_numpy(np.float64) * keep
+        return {
+            "total_sales": self._half_width(sales),
+            "total_profit": self._half_width(profit),
+            "total_orders": self._half_width(keep),
+            "profit_margin": 100 * self._ratio_half_width(profit, sales),
+            "avg_order_value": self._ratio_half_width(sales, keep),
+            "avg_discount": 100 * self._ratio_half_width(discount, keep),
+        }
+
+    def group_intervals(self, keep, labels, by, measure="Sales"):
+        """Half-widths of the estimated measure total per label of by ("Category",
+        "Region" or "Month"), in the order of labels."""
+        row_codes, uniques = self.groups[by]
+        positions = pd.Index(pd.Series(labels).astype(str)).get_indexer(pd.Index(uniques))
+        codes = np.where(row_codes >= 0, positions[row_codes], -1)
+        values = np.where(codes >= 0, self.rows[measure].to_numpy(np.float64) * keep, 0.0)
+        return self._half_widths(values, np.maximum(codes, 0), len(labels))
+
+    # Estimates
+
+    def daily_series(self, filters):
+        return DailySeries.from_cube(self._selection_cube(dict(filters, date_range=None)))
+
+    def describe(self, keep):
+        """Weighted counterpart of analytics.describe_selection."""
+        rows, weights = self.rows[keep], self.weights[keep]
+        stats = {}
+        for col in DESCRIBE_COLUMNS:
+            values = rows[col].to_numpy(np.float64)
+            mean = np.average(values, weights=weights)
+            variance = np.average((values - mean) ** 2, weights=weights)
+            if len(values) > 1:
+                variance *= len(values) / (len(values) - 1)
+            stats[col] = [
+                weights.sum(), mean, np.sqrt(variance), values.min(),
+                *weighted_quantiles(values, weights, [0.25, 0.5, 0.75]), values.max(),
+            ]
+        stats_df = pd.DataFrame(stats, index=["count", "mean", "std", "min", "25%", "50%", "75%", "max"])
+        profitable = rows["Profit"].to_numpy() > 0
+        avg_discount_profitable = (
+            np.average(rows["Discount"].to_numpy(np.float64)[profitable], weights=weights[profitable]) * 100
+            if profitable.any() else np.nan
+        )
+        return stats_df, avg_discount_profitable
+
+    def sales_histogram(self, keep, bins=HISTOGRAM_BINS):
+        sales = self.rows["Sales"].to_numpy(np.float64)
+        edges = np.histogram_bin_edges(sales[keep], bins=bins)
+        counts = np.histogram(sales[keep], bins=edges, weights=self.weights[keep])[0]
+        bin_of = np.clip(np.searchsorted(edges, sales, side="right") - 1, 0, bins - 1)
+        return counts, edges, self._half_widths(keep.astype(np.float64), bin_of, bins)
+
+    def estimate(self, filters, comparison=DEFAULT_COMPARISON):
+        """Estimated aggregates for a filter set, shaped like analytics.aggregates; None when
+        no sampled row matches.
+
+        On top of the usual tables it holds "intervals" (KPI half-widths), "errors" (per-bar
+        half-widths of the Sales tables), "sales_histogram", "summary" (as describe_selection)
+        and "sample_rows" (positions into self.rows).
+        """
+        keep = self.mask(filters)
+        if not keep.any():
+            return None
+        cube = self._selection_cube(filters)
+        aggs = summarize_cube(cube)
+        aggs["kpis"]["total_orders"] = int(round(cube["Orders"].sum()))
+        if comparison is not None:
+            aggs["kpis"].update(self.daily_series(filters).compare(comparison, filters.get("date_range")))
+
+        aggs["intervals"] = self.kpi_intervals(keep)
+        aggs["errors"] = {
+            "sales_by_category": self.group_intervals(keep, aggs["sales_by_category"]["Category"], "Category"),
+            "regional_performance": self.group_intervals(keep, aggs["regional_performance"]["Region"], "Region"),
+            "monthly_sales": self.group_intervals(keep, aggs["monthly_sales"]["Order Date"], "Month"),
+        }
+        aggs["sales_histogram"] = self.sales_histogram(keep)
+        aggs["summary"] = self.describe(keep)
+        aggs["sample_rows"] = np.flatnonzero(keep)
+        return aggs
+
+
+class BackgroundResults:
+    """Futures keyed by e.g. a filter state, run on a small shared thread pool."""
+
+    def __init__(self, workers=2, max_entries=32, name="sales-exact"):
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix=name)
+        self.max_entries = max_entries
+        self.futures = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, key, fn, *args):
+        """The future for key, starting fn(*args) if there is none (or it failed)."""
+        with self.lock:
+            future = self.futures.get(key)
+            if future is None or (future.done() and future.exception() is not None):
+                future = self.futures[key] = self.pool.submit(fn, *args)
+            self.futures.move_to_end(key)
+            while len(self.futures) > self.max_entries:
+                self.futures.popitem(last=False)
+            return future
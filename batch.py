@@ -0,0 +1,98 @@
+import argparse
+import itertools
+import json
+import sys
+from pathlib import Path
+
+from analytics import load_dataset, summaries_to_frames, summarize_many
+from filter_engine import DIMENSION_FILTERS
+from parallel import DEFAULT_WORKERS
+from timeseries import COMPARISON_MODES, DEFAULT_COMPARISON
+
+# Batch summaries
+#
+# Loads and indexes a dataset once, evaluates every filter set against it and
+# writes the results, e.g. for a nightly job:
+#
+#   python batch.py superstore.csv --grid Region Category --out summaries/
+#   python batch.py superstore.csv --filters filter_sets.json --format json
+#
+# A filter file maps names to filter dicts (see analytics.py), or is a list of
+# filter dicts with a "name" key.
+
+GRID_FILTERS = {dim: key for key, dim in DIMENSION_FILTERS.items()}
+
+
+def read_filter_sets(path):
+    with open(path) as fh:
+        data = json.load(fh)
+    if isinstance(data, list):
+        return {item.pop("name", f"set_{i}"): item for i, item in enumerate(data)}
+    return data
+
+
+def grid_filter_sets(dataset, dimensions):
+    # Every combination of single values (or "All") across the given dimensions
+    choices = []
+    for dim in dimensions:
+        values = [None] + list(dataset.engine.values[dim])
+        choices.append([(dim, value) for value in values])
+
+    filter_sets = {}
+    for combo in itertools.product(*choices):
+        name = " | ".join(f"{dim}={value}" for dim, value in combo if value is not None) or "All"
+        filter_sets[name] = {
+            GRID_FILTERS[dim]: [value] for dim, value in combo if value is not None
+        }
+    return filter_sets
+
+
+def write_results(results, out_dir, fmt):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+    if fmt in ("json", "both"):
+        path = out_dir / "summaries.json"
+        with open(path, "w") as fh:
+            json.dump(results, fh, indent=2, default=str)
+        written.append(path)
+    if fmt in ("parquet", "both"):
+        kpi_df, regional_df = summaries_to_frames(results)
+        for name, frame in [("kpis", kpi_df), ("regional_performance", regional_df)]:
+            path = out_dir / f"{name}.parquet"
+            frame.to_parquet(path, index=False)
+            written.append(path)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute dashboard summaries for many filter sets.")
+    parser.add_argument("data", help="sales CSV file")
+    parser.add_argument("--filters", help="JSON file of named filter sets")
+    parser.add_argument("--grid", nargs="+", choices=sorted(GRID_FILTERS),
+                        help="also summarize every value combination of these dimensions")
+    parser.add_argument("--out", default="summaries", help="output directory (default: summaries)")
+    parser.add_argument("--format", choices=["parquet", "json", "both"], default="both")
+    parser.add_argument("--comparison", choices=COMPARISON_MODES, default=DEFAULT_COMPARISON,
+                        help="window the KPI deltas compare against (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="aggregate on this many workers (default: SALES_WORKERS or 1)")
+    args = parser.parse_args(argv)
+
+    dataset = load_dataset(args.data, args.workers)
+    filter_sets = {"All": {}}
+    if args.filters:
+        filter_sets.update(read_filter_sets(args.filters))
+    if args.grid:
+        filter_sets.update(grid_filter_sets(dataset, args.grid))
+
+    results = summarize_many(dataset, filter_sets, args.comparison)
+    for path in write_results(results, Path(args.out), args.format):
+        print(f"wrote {path}")
+    empty = [name for name, summary in results.items() if summary is None]
+    if empty:
+        print(f"{len(empty)} filter set(s) matched no rows", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
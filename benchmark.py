@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Benchmark harness
+#
+# Times every hot path of the dashboard on synthetic Superstore data at
+# several scales and writes the results as JSON for run-to-run comparison:
+#
+#   python benchmark.py --rows 10k 1M 10M 50M --out bench.json
+#   python benchmark.py --rows 1M --compare bench.json
+#
+# Each scale runs in its own subprocess so peak RSS is reported per scale.
+# Generated CSVs are kept under SYNTHETIC_DIR and reused by later runs.
+
+SYNTHETIC_DIR = Path(".cache/synthetic")
+DEFAULT_ROWS = ["10k", "1M"]
+REPEATS = 3
+SEARCH_TERM = "chair"
+
+
+def parse_rows(text):
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class Timings:
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, fn, repeats=1):
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - start)
+        self.stages[name] = {"seconds": round(best, 6), "peak_rss_mb": round(peak_rss_mb(), 1)}
+        print(f"  {name:<28} {best:10.4f}s  peak {self.stages[name]['peak_rss_mb']:8.1f} MB", file=sys.stderr)
+        return result
+
+
+def synthetic_csv(n_rows):
+    from synthetic import write_superstore_csv
+
+    path = SYNTHETIC_DIR / f"superstore_{n_rows}.csv"
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        write_superstore_csv(tmp_path, n_rows)
+        tmp_path.rename(path)
+    return path
+
+
+def benchmark_scale(n_rows, workers=1):
+    import analytics
+    import charts
+    from data_cache import load_cached
+    from export import export_rows
+    from geography import GEO_LEVELS, GeoRollup
+    from timeseries import COMPARISON_MODES
+
+    timings = Timings()
+    path = timings.run("generate", lambda: synthetic_csv(n_rows))
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        df, key = timings.run("load_cold", lambda: load_cached(path, cache_dir=cache_dir))
+        df, key = timings.run("load_warm", lambda: load_cached(path, cache_dir=cache_dir), REPEATS)
+
+    dataset = analytics.Dataset(df, key)
+    timings.run("build_filter_engine", lambda: dataset.engine)
+    timings.run("build_cube", lambda: dataset.cube)
+    parallel_cube = timings.run(
+        "build_cube_parallel", lambda: analytics.Dataset(df, key, workers).build_cube(), REPEATS)
+    parallel_identical = parallel_cube.equals(dataset.cube)
+
+    # A typical narrowed selection: one year, two regions, two categories
+    last_year = df["Order Date"].max().year
+    filters = {
+        "date_range": (f"{last_year}-01-01", f"{last_year}-12-31"),
+        "regions": ["West", "East"],
+        "categories": ["Technology", "Furniture"],
+    }
+    ranged = dict(filters, sales_range=(10.0, 5000.0))
+    rows = timings.run("filter", lambda: analytics.select_rows(dataset, filters), REPEATS)
+    timings.run("facets_dates", lambda: dataset.engine.facets(filters["date_range"], {}), REPEATS)
+    timings.run("facets", lambda: dataset.engine.facets(
+        filters["date_range"], {"Region": filters["regions"], "Category": filters["categories"]},
+        ranged["sales_range"]), REPEATS)
+    timings.run("filter_sales_range", lambda: analytics.select_rows(dataset, ranged), REPEATS)
+    timings.run("build_distinct_index", lambda: dataset.distinct)
+    timings.run("distinct_exact", lambda: dataset.distinct.count(rows), REPEATS)
+    timings.run("build_sketches", lambda: dataset.sketches)
+    timings.run("distinct_sketch", lambda: dataset.sketches.count(
+        filters, lambda date_range: analytics.select_rows(dataset, dict(filters, date_range=date_range))), REPEATS)
+
+    aggs = timings.run("aggregate_cube", lambda: analytics.aggregates(dataset, filters, rows, None), REPEATS)
+    timings.run("aggregate_rows", lambda: analytics.aggregates(dataset, ranged, comparison=None), REPEATS)
+    series = timings.run("build_daily_series", lambda: analytics.daily_series(dataset, filters), REPEATS)
+    timings.run("compare_periods", lambda: [
+        series.compare(mode, filters["date_range"]) for mode in COMPARISON_MODES
+    ], REPEATS)
+    timings.run("build_sample", lambda: dataset.sample)
+    timings.run("estimate", lambda: dataset.sample.estimate(ranged, None), REPEATS)
+    selection = df.iloc[rows]
+
+    timings.run("tab_overview", lambda: (
+        charts.category_sales_bar(aggs["sales_by_category"]),
+        charts.region_pie(aggs["sales_by_region"]),
+        charts.sales_profit_scatter(selection),
+        charts.category_margin_bar(aggs["profit_margin_by_cat"]),
+    ))
+    timings.run("tab_trends", lambda: (
+        charts.monthly_trend_line(aggs["monthly_sales"]),
+        charts.quarterly_bar(aggs["quarterly_data"]),
+    ))
+    timings.run("tab_geographic", lambda: (
+        charts.regional_sales_bar(aggs["regional_performance"]),
+        charts.regional_margin_bar(aggs["regional_performance"]),
+    ))
+    timings.run("geo_rollup", lambda: GeoRollup(df[GEO_LEVELS + ["Sales", "Profit"]].iloc[rows]))
+    timings.run("tab_performance", lambda: (
+        charts.discount_impact_bar(aggs["discount_impact"]),
+        charts.sales_histogram(selection),
+    ))
+    timings.run("tab_deep_dive", lambda: analytics.describe_selection(dataset, rows))
+
+    figure_cache = charts.FigureCache()
+    cached_figures = lambda: [figure_cache.draw(build, aggs[table]) for build, table in [
+        (charts.category_sales_bar, "sales_by_category"), (charts.region_pie, "sales_by_region"),
+        (charts.category_margin_bar, "profit_margin_by_cat"), (charts.monthly_trend_line, "monthly_sales"),
+        (charts.quarterly_bar, "quarterly_data"), (charts.regional_sales_bar, "regional_performance"),
+        (charts.regional_margin_bar, "regional_performance"), (charts.discount_impact_bar, "discount_impact"),
+    ]]
+    timings.run("figures_cache_fill", cached_figures)
+    timings.run("figures_cache_hit", cached_figures, REPEATS)
+
+    timings.run("build_search_index", lambda: dataset.search_index)
+    timings.run("search", lambda: np.intersect1d(
+        dataset.search_index.search(SEARCH_TERM), rows, assume_unique=True), REPEATS)
+
+    timings.run("build_sort_order", lambda: dataset.sort_index.order("Customer Name"))
+    timings.run("sort_page", lambda: df.iloc[
+        dataset.sort_index.sort_rows(rows, "Customer Name", ascending=False)[-25:]], REPEATS)
+
+    timings.run("export_csv_gzip", lambda: export_rows(df, rows, "CSV (gzip)"))
+    timings.run("export_parquet", lambda: export_rows(df, rows, "Parquet"))
+
+    return {
+        "rows": n_rows,
+        "selected_rows": int(len(rows)),
+        "workers": workers,
+        "parallel_identical": parallel_identical,
+        "stages": timings.stages,
+    }
+
+
+def run_in_subprocess(n_rows, workers):
+    proc = subprocess.run(
+        [sys.executable, __file__, "--worker", str(n_rows), "--workers", str(workers)],
+        stdout=subprocess.PIPE, check=True, text=True,
+    )
+    return json.loads(proc.stdout)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as fh:
+        baseline = json.load(fh)["results"]
+    print(f"{'rows':>10}  {'stage':<28} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for rows, result in results.items():
+        for stage, timing in result["stages"].items():
+            before = baseline.get(rows, {}).get("stages", {}).get(stage)
+            if before is None or before["seconds"] == 0:
+                continue
+            ratio = timing["seconds"] / before["seconds"]
+            print(f"{rows:>10}  {stage:<28} {before['seconds']:10.4f} {timing['seconds']:10.4f} {ratio:6.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard hot paths on synthetic data.")
+    parser.add_argument("--rows", nargs="+", default=DEFAULT_ROWS,
+                        help="row counts to benchmark, e.g. 10k 1M 10M 50M (default: 10k 1M)")
+    parser.add_argument("--out", default="benchmark_results.json", help="results file")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="workers for the build_cube_parallel stage (default: all cores)")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        json.dump(benchmark_scale(args.worker, args.workers), sys.stdout)
+        return 0
+
+    results = {}
+    for text in args.rows:
+        n_rows = parse_rows(text)
+        print(f"{n_rows:,} rows", file=sys.stderr)
+        results[str(n_rows)] = run_in_subprocess(n_rows, args.workers)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"wrote {args.out}", file=sys.stderr)
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
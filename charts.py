@@ -0,0 +1,326 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+
+import parallel
+
+# Figure builders
+#
+# Every chart takes an already-aggregated frame, so the same figure can be
+# drawn from in-memory rows or from out-of-core aggregates. The two row-level
+# charts switch to a large-selection mode above LARGE_SELECTION_ROWS: the
+# scatter is density-sampled and drawn with WebGL, and the histogram is
+# binned in NumPy so only bar heights reach the browser.
+#
+# Charts drawn from estimates (see approximate.py) take per-bar interval
+# half-widths as error bars.
+#
+# Built figures are kept in a FigureCache keyed by chart id, a digest of the
+# data the chart is drawn from and the theme, so an unchanged chart is not
+# rebuilt on a rerun. Cached figures are compacted first: float trace arrays
+# become float32 and integer ones int32, which Plotly sends to the browser as
+# base64 typed arrays at half the size.
+
+LARGE_SELECTION_ROWS = 100_000
+SCATTER_POINT_BUDGET = 20_000
+DENSITY_GRID = 128
+HISTOGRAM_BINS = 30
+FIGURE_CACHE_ENTRIES = 256
+
+# Shared by every chart. It is set on each figure's own layout rather than
+# registered as a template, because Streamlit's theme replaces template layouts
+LAYOUT = go.Layout(
+    plot_bgcolor='rgba(0,0,0,0)',
+    paper_bgcolor='rgba(0,0,0,0)',
+    font=dict(size=12),
+    title_font_size=16
+)
+
+
+def theme():
+    """Name of the template figures are built with (Streamlit's under Streamlit)."""
+    return pio.templates.default
+
+
+def style(fig):
+    fig.update_layout(LAYOUT)
+    return fig
+
+
+def category_sales_bar(sales_by_category, errors=None):
+    return style(px.bar(
+        sales_by_category,
+        x="Category",
+        y="Sales",
+        error_y=errors,
+        title=" Sales Performance by Category",
+        color="Category",
+        color_discrete_sequence=px.colors.qualitative.Set3
+    ))
+
+
+def region_pie(sales_by_region):
+    fig = px.pie(
+        sales_by_region,
+        names="Region",
+        values="Sales",
+        title=" Revenue Distribution by Region",
+        color_discrete_sequence=px.colors.qualitative.Pastel
+    )
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    return style(fig)
+
+
+def density_sample(x, y, budget=SCATTER_POINT_BUDGET, grid=DENSITY_GRID, seed=0):
+    """Positions of at most ~budget points that keep the shape and every outlier.
+
+    Points are binned on a grid x grid lattice. Cells holding few points are
+    sparse regions and are kept whole, which retains outliers; dense cells are
+    thinned to an equal random quota, and each axis extreme is always kept.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n <= budget:
+        return np.arange(n)
+
+    def cell_index(v):
+        span = v.max() - v.min()
+        if span == 0:
+            return np.zeros(len(v), dtype=np.int64)
+        return np.minimum(((v - v.min()) / span * grid).astype(np.int64), grid - 1)
+
+    cells = cell_index(x) * grid + cell_index(y)
+    counts = np.bincount(cells, minlength=grid * grid)
+    occupied = np.count_nonzero(counts)
+    quota = max(1, budget // occupied)
+
+    # Random rank of each point within its cell
+    perm = np.random.default_rng(seed).permutation(n)
+    order = perm[np.argsort(cells[perm], kind="stable")]
+    starts = np.concatenate([[0], np.cumsum(counts)])[cells[order]]
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n) - starts
+
+    keep = rank < quota
+    keep[[x.argmin(), x.argmax(), y.argmin(), y.argmax()]] = True
+    return np.flatnonzero(keep)
+
+
+def sales_profit_scatter(rows, large_threshold=LARGE_SELECTION_ROWS):
+    if len(rows) <= large_threshold:
+        return style(px.scatter(
+            rows,
+            x="Sales",
+            y="Profit",
+            color="Category",
+            size="Discount",
+            title=" Sales vs Profit Analysis",
+            hover_data=["Region"]
+        ))
+
+    keep = density_sample(rows["Sales"].to_numpy(), rows["Profit"].to_numpy())
+    return style(px.scatter(
+        rows.iloc[keep],
+        x="Sales",
+        y="Profit",
+        color="Category",
+        size="Discount",
+        title=f" Sales vs Profit Analysis ({len(keep):,} of {len(rows):,} points, outliers kept)",
+        hover_data=["Region"],
+        render_mode="webgl"
+    ))
+
+
+def category_margin_bar(profit_margin_by_cat):
+    return style(px.bar(
+        profit_margin_by_cat,
+        x="Category",
+        y="Profit Margin",
+        title=" Profit Margin by Category",
+        color="Profit Margin",
+        color_continuous_scale="RdYlGn"
+    ))
+
+
+def monthly_trend_line(monthly_sales, errors=None):
+    fig = px.line(
+        monthly_sales,
+        x="Order Date",
+        y="Sales",
+        error_y=errors,
+        title=" Monthly Sales Trend",
+        markers=True
+    )
+    fig.update_traces(line_color='#667eea', marker_color='#764ba2')
+    return style(fig)
+
+
+def quarterly_bar(quarterly_data):
+    return style(px.bar(
+        quarterly_data,
+        x="Quarter",
+        y="Sales",
+        color="Category",
+        title=" Quarterly Sales by Category",
+        barmode="stack"
+    ))
+
+
+def regional_sales_bar(regional_performance, errors=None):
+    return style(px.bar(
+        regional_performance,
+        x="Region",
+        y="Total Sales",
+        error_y=errors,
+        title=" Sales by Region",
+        color="Total Sales",
+        color_continuous_scale="Blues"
+    ))
+
+
+def regional_margin_bar(regional_performance):
+    return style(px.bar(
+        regional_performance,
+        x="Region",
+        y="Profit Margin",
+        title=" Profit Margin by Region",
+        color="Profit Margin",
+        color_continuous_scale="RdYlGn"
+    ))
+
+
+def state_choropleth(states):
+    # states: one row per state with its two-letter postal Code
+    fig = px.choropleth(
+        states.dropna(subset=["Code"]),
+        locations="Code",
+        locationmode="USA-states",
+        color="Sales",
+        scope="usa",
+        hover_name="State",
+        hover_data={"Code": False, "Profit": ":,.0f", "Profit Margin": ":.1f"},
+        title="🗺️ Sales by State",
+        color_continuous_scale="Blues"
+    )
+    fig.update_layout(geo=dict(bgcolor='rgba(0,0,0,0)'))
+    return style(fig)
+
+
+def discount_impact_bar(discount_impact):
+    return style(px.bar(
+        discount_impact,
+        x='Discount',
+        y=['Sales', 'Profit'],
+        title="🏷 Impact of Discounts on Performance",
+        barmode='group'
+    ))
+
+
+def sales_histogram(rows, large_threshold=LARGE_SELECTION_ROWS, workers=None):
+    if len(rows) > large_threshold:
+        counts, edges = parallel.histogram(rows["Sales"].to_numpy(), HISTOGRAM_BINS, workers)
+        return binned_sales_histogram(counts, edges)
+    return style(px.histogram(
+        rows,
+        x="Sales",
+        nbins=HISTOGRAM_BINS,
+        title=" Sales Distribution",
+        color_discrete_sequence=['#667eea']
+    ))
+
+
+def binned_sales_histogram(counts, edges, errors=None):
+    # Histogram from precomputed bin counts; only the bar heights reach the browser
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=edges[1:] - edges[:-1],
+        error_y=dict(type="data", array=errors) if errors is not None else None,
+        marker_color='#667eea',
+    ))
+    fig.update_layout(title=" Sales Distribution", xaxis_title="Sales", yaxis_title="count", bargap=0)
+    return style(fig)
+
+
+# Figure cache
+
+def data_hash(*tables):
+    """Digest of the frames, arrays and plain values a chart is drawn from."""
+    digest = hashlib.blake2b(digest_size=16)
+    for table in tables:
+        if isinstance(table, (pd.DataFrame, pd.Series)):
+            digest.update(repr(table.columns.tolist() if isinstance(table, pd.DataFrame) else table.name).encode())
+            digest.update(pd.util.hash_pandas_object(table).to_numpy().tobytes())
+        elif isinstance(table, np.ndarray):
+            digest.update(table.dtype.str.encode())
+            digest.update(np.ascontiguousarray(table).tobytes())
+        else:
+            digest.update(repr(table).encode())
+    return digest.hexdigest()
+
+
+def _compact_arrays(props):
+    # The float64/int64 arrays of a trace's properties, downcast, nested as in props
+    changed = {}
+    for name, value in props.items():
+        if isinstance(value, dict):
+            value = _compact_arrays(value)
+            if value:
+                changed[name] = value
+        elif isinstance(value, np.ndarray) and value.dtype == np.float64:
+            changed[name] = value.astype(np.float32)
+        elif isinstance(value, np.ndarray) and value.dtype == np.int64:
+            if len(value) == 0 or np.abs(value).max() < 2 ** 31:
+                changed[name] = value.astype(np.int32)
+    return changed
+
+
+def compact(fig):
+    """Downcast a figure's trace arrays in place (float32, int32) and return it."""
+    for trace in fig.data:
+        changed = _compact_arrays(trace.to_plotly_json())
+        if changed:
+            trace.update(changed)
+    return fig
+
+
+class FigureCache:
+    """Compacted figures keyed by (chart id, data key, theme), least recently used evicted first.
+
+    Figures are shared by every caller and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=FIGURE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.figures = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def figure(self, chart_id, data_key, build):
+        """The figure for chart_id drawn from the data data_key stands for, from build() on a miss."""
+        key = (chart_id, data_key, theme())
+        with self.lock:
+            fig = self.figures.get(key)
+            if fig is not None:
+                self.figures.move_to_end(key)
+                self.hits += 1
+                return fig
+            self.misses += 1
+        fig = compact(build())
+        with self.lock:
+            self.figures[key] = fig
+            while len(self.figures) > self.max_entries:
+                self.figures.popitem(last=False)
+        return fig
+
+    def draw(self, build, *tables):
+        """build(*tables) from the cache, keyed by the builder's name and a digest of the tables."""
+        return self.figure(build.__name__, data_hash(*tables), lambda: build(*tables))
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+from filter_engine import DIMENSION_FILTERS
+from timeseries import HALVES, DailySeries
+
+# Pre-aggregated sales cube
+#
+# Rows are collapsed to day x Region x Category x Segment x discount-bin cells
+# holding additive measures only (sums and counts), so any combination of
+# date/Region/Category/Segment filters can be answered by masking and
+# re-summing cells instead of grouping raw rows. Cubes built from separate chunks merge
+# by summing matching cells. Rows tagged with group codes build one cube per
+# group in a single pass, under a leading GROUP key.
+
+CUBE_DIMENSIONS = ["Region", "Category", "Segment"]
+MEASURES = ["Sales", "Profit", "Discount", "Orders"]
+DISCOUNT_BIN = "Discount Bin"
+DISCOUNT_BIN_DECIMALS = 2
+DISCOUNT_LABELS = ['0-10%', '10-20%', '20-30%', '30-40%', '40-50%']
+GROUP = "Group"
+
+
+def cube_keys(columns):
+    return ["Order Date"] + [c for c in CUBE_DIMENSIONS if c in columns] + [DISCOUNT_BIN]
+
+
+def build_cube(df, weights=None, groups=None):
+    rows = pd.DataFrame({
+        "Order Date": df["Order Date"].dt.normalize(),
+        DISCOUNT_BIN: df["Discount"].astype(np.float64).round(DISCOUNT_BIN_DECIMALS),
+        "Sales": df["Sales"],
+        "Profit": df["Profit"],
+        "Discount": df["Discount"].astype(np.float64),
+        "Orders": np.ones(len(df), dtype=np.int64),
+    })
+    # Rows sampled with expansion weights sum to estimates of the full totals
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)
+        for col in MEASURES:
+            rows[col] = rows[col].to_numpy() * weights
+    for col in CUBE_DIMENSIONS:
+        if col in df.columns:
+            rows[col] = df[col]
+    # Sorted cells give the same cube whether built at once or per date range
+    keys = cube_keys(df.columns)
+    if groups is not None:
+        rows[GROUP] = groups
+        keys = [GROUP] + keys
+    return rows.groupby(keys, observed=True, sort=True)[MEASURES].sum().reset_index()
+
+
+def merge_cubes(cubes):
+    cubes = [c for c in cubes if c is not None]
+    if len(cubes) == 1:
+        return cubes[0]
+    merged = pd.concat(cubes, ignore_index=True)
+    keys = cube_keys(merged.columns)
+    return merged.groupby(keys, observed=True, sort=False)[MEASURES].sum().reset_index()
+
+
+def cube_answers(filters):
+    """Whether a filter dict (see analytics.py) only filters on what the cube holds."""
+    return filters.get("sales_range") is None and all(
+        filters.get(key) is None for key, dim in DIMENSION_FILTERS.items() if dim not in CUBE_DIMENSIONS
+    )
+
+
+def filter_cube(cube, date_range=None, regions=None, categories=None, segments=None):
+    mask = np.ones(len(cube), dtype=bool)
+    if date_range is not None:
+        start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1])
+        mask &= ((cube["Order Date"] >= start) & (cube["Order Date"] <= end)).to_numpy()
+    if regions is not None:
+        mask &= cube["Region"].isin(regions).to_numpy()
+    if categories is not None:
+        mask &= cube["Category"].isin(categories).to_numpy()
+    if segments is not None:
+        mask &= cube["Segment"].isin(segments).to_numpy()
+    return cube[mask]
+
+
+def discount_impact(cube):
+    # Same equal-width bins as pd.cut(Discount, bins=5) over the selection,
+    # applied to the discount-bin values instead of individual rows
+    totals = cube.groupby(DISCOUNT_BIN)[["Sales", "Profit", "Orders"]].sum()
+    bins = pd.cut(totals.index.to_numpy(), bins=len(DISCOUNT_LABELS), labels=DISCOUNT_LABELS)
+    grouped = totals.groupby(bins, observed=False)[["Sales", "Profit", "Orders"]].sum()
+    impact = pd.DataFrame({
+        "Sales": grouped["Sales"] / grouped["Orders"],
+        "Profit": grouped["Profit"] / grouped["Orders"],
+    })
+    impact.index.name = "Discount"
+    return impact.reset_index()
+
+
+def summarize_cube(cube):
+    """KPIs and every chart-ready frame the dashboard draws from aggregates."""
+    if cube.empty:
+        return None
+
+    total_sales = cube["Sales"].sum()
+    total_profit = cube["Profit"].sum()
+    total_orders = int(cube["Orders"].sum())
+    deltas = DailySeries.from_cube(cube).compare(HALVES)
+
+    by_category = cube.groupby("Category", observed=True)[["Sales", "Profit"]].sum()
+    by_region = cube.groupby("Region", observed=True)[["Sales", "Profit", "Orders"]].sum()
+
+    monthly = cube.groupby(cube["Order Date"].dt.to_period("M"))["Sales"].sum().reset_index()
+    monthly["Order Date"] = monthly["Order Date"].astype(str)
+
+    quarterly = cube.assign(Quarter=cube["Order Date"].dt.to_period("Q").astype(str))
+    quarterly = quarterly.groupby(["Quarter", "Category"], observed=True)["Sales"].sum().reset_index()
+
+    regional = by_region.reset_index()
+    regional.columns = ["Region", "Total Sales", "Total Profit", "Order Count"]
+    regional["Profit Margin"] = (regional["Total Profit"] / regional["Total Sales"] * 100).round(2)
+
+    margin = (by_category["Profit"] / by_category["Sales"] * 100).where(by_category["Sales"] > 0, 0)
+
+    return {
+        "kpis": {
+            "total_sales": total_sales,
+            "total_profit": total_profit,
+            "avg_discount": cube["Discount"].sum() / total_orders * 100,
+            "profit_margin": (total_profit / total_sales * 100) if total_sales > 0 else 0,
+            "total_orders": total_orders,
+            "avg_order_value": total_sales / total_orders if total_orders > 0 else 0,
+            "sales_delta": deltas["sales_delta"],
+            "profit_delta": deltas["profit_delta"],
+            "orders_delta": deltas["orders_delta"],
+        },
+        "sales_by_category": by_category["Sales"].reset_index(),
+        "sales_by_region": by_region["Sales"].reset_index(),
+        "profit_margin_by_cat": margin.rename("Profit Margin").reset_index(),
+        "monthly_sales": monthly,
+        "quarterly_data": quarterly,
+        "regional_performance": regional,
+        "discount_impact": discount_impact(cube),
+        "best_region": by_region["Sales"].idxmax(),
+        "best_category": by_category["Profit"].idxmax(),
+    }
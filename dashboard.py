@@ -5,6 +5,26 @@ import streamlit as st
 import numpy as np
 from datetime import datetime, timedelta
 import time
+import inspect
+import uuid
+
+import charts
+import analytics
+from analytics import Dataset
+from approximate import BackgroundResults
+from data_cache import apply_types, excel_sheets, is_excel, load_cached, load_excel_cached
+from distinct import DISTINCT_GROUPS, HLL_ERROR
+from incremental import IncrementalSource
+from export import EXPORT_FORMATS, XLSX_MIME, export_rows, export_workbook
+from filter_engine import DIMENSION_FILTERS
+from geography import GEO_LEVELS, GeoRollup, has_geography
+from instrumentation import RerunProfile, latency_quantiles, memory_figures, register_shared, release_shared
+from parallel import DEFAULT_WORKERS
+import schema
+from sql_backend import SqlBackend, build_database
+from streaming import file_signature, scan_bounds, stream_aggregates
+from timeseries import COMPARISON_MODES, DEFAULT_COMPARISON
+from warmup import FilterHistory, warm_plan
 
 # Page Configuration
 
@@ -93,15 +113,55 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Rerun instrumentation
+# Named stages of this run are timed into the profile; it is logged at the end
+# of the script and shown in the sidebar Performance panel
+
+session_id = st.session_state.setdefault("perf_session", uuid.uuid4().hex[:12])
+profile = RerunProfile(session_id)
+
+def plotly_chart(fig, name, slot=st):
+    with profile.span(f"plotly_chart:{name}"):
+        slot.plotly_chart(fig, use_container_width=True)
+
+# Progressive rendering: a view lays out placeholders for its charts first and
+# fills each one once its figure is ready, so the page never waits blank
+
+def chart_slots(count):
+    """Placeholders for count charts, two per row, each showing a loading note."""
+    slots = []
+    for start in range(0, count, 2):
+        for column in st.columns(2)[:count - start]:
+            slot = column.empty()
+            slot.caption("⏳ Preparing chart…")
+            slots.append(slot)
+    return slots
+
 # Load Data with Error Handling
+# A loaded frame is held once per process and shared, read-only, by every
+# session (a data cache would hand each caller its own unpickled copy). Runs
+# work on row-id selections and a shallow view of it, see "Per-run view".
+# A file path is passed with its file_signature, so an edited file is a new
+# entry and is read (and content-hashed) again. At most four frames are held;
+# an evicted one is dropped from the shared-memory figures. Each is registered
+# under its own key, as two entries can hold the same content (an edited file
+# changed back, an upload of the default file)
+
+def shared_key(df, data_key):
+    return f"{data_key}@{id(df):x}"
+
+def release_data(entry):
+    release_shared(shared_key(*entry))
 
-@st.cache_data
-def load_data(file_path=None, uploaded_file=None):
+@st.cache_resource(max_entries=4, on_release=release_data, show_spinner="Loading data...")
+def load_data(file_path=None, uploaded_file=None, sheet=None, signature=None):
     try:
-        if uploaded_file is not None:
-            df = pd.read_csv(uploaded_file, encoding="latin-1")
+        if uploaded_file is not None and is_excel(uploaded_file):
+            df, data_key = load_excel_cached(uploaded_file, sheet)
+        elif uploaded_file is not None:
+            df, data_key = load_cached(uploaded_file)
         elif file_path:
-            df = pd.read_csv(file_path, encoding="latin-1")
+            df, data_key = load_cached(file_path)
         else:
             # Sample data if no file is provided
             np.random.seed(42)
@@ -114,17 +174,398 @@ def load_data(file_path=None, uploaded_file=None):
                 'Profit': np.random.uniform(-500, 1500, 1000),
                 'Discount': np.random.uniform(0, 0.5, 1000)
             }
-            df = pd.DataFrame(sample_data)
+            df = apply_types(pd.DataFrame(sample_data))
+            data_key = "sample"
         
-        # Clean data
-        df.columns = df.columns.str.strip()
-        if 'Order Date' in df.columns:
-            df['Order Date'] = pd.to_datetime(df['Order Date'])
-        
-        return df
+        register_shared(shared_key(df, data_key), int(df.memory_usage(index=True, deep=True).sum()))
+        return df, data_key
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
-        return None
+        return None, None
+
+@st.cache_data(show_spinner=False)
+def list_sheets(uploaded_file):
+    return excel_sheets(uploaded_file)
+
+@st.cache_resource(max_entries=4, show_spinner="Indexing data...")
+def load_dataset_handle(data_key, _df):
+    dataset = Dataset(_df, data_key)
+    dataset.engine  # the sidebar needs the filter index right away
+    return dataset
+
+@st.cache_resource
+def live_source(file_path):
+    # One incremental reader per file, shared by every session
+    return IncrementalSource(file_path, workers=DEFAULT_WORKERS)
+
+@st.cache_data(show_spinner="Scanning file...")
+def load_stream_bounds(file_path, signature):
+    return scan_bounds(file_path)
+
+@st.cache_data(show_spinner="Streaming file in chunks...")
+def load_stream_aggregates(file_path, signature, sales_bounds, date_range, regions, categories, sales_range):
+    return stream_aggregates(file_path, sales_bounds, date_range, regions, categories, sales_range)
+
+@st.cache_resource(show_spinner="Loading file into SQLite...")
+def load_sql_database(file_path, signature):
+    return build_database(file_path)
+
+@st.cache_data(show_spinner=False)
+def load_sql_bounds(db_path):
+    return SqlBackend(db_path).bounds()
+
+@st.cache_data(max_entries=64, show_spinner="Querying SQLite...")
+def load_sql_aggregates(db_path, sales_bounds, date_range, regions, categories, sales_range, comparison_mode):
+    return SqlBackend(db_path).aggregates(sales_bounds, date_range, regions, categories, sales_range, comparison_mode)
+
+# Cached selection computations
+# Results are memoized on the filter state, so reruns that leave the filters
+# untouched (tab switches, widget changes) reuse them
+
+# The daily series behind the deltas ignores the date range, so moving the
+# dates or switching comparison mode is only a few binary searches
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def selection_aggregates(filter_state, _dataset, _filters, _rows):
+    return analytics.aggregates(_dataset, _filters, _rows, comparison=None)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def selection_series(series_state, _dataset, _filters):
+    return analytics.daily_series(_dataset, _filters)
+
+# Distinct orders, customers and products. Exact aggregates carry the counts
+# already; the deltas (and the counts shown next to estimates) are cached per
+# filter state and comparison mode
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def selection_distinct(filter_state, comparison_mode, _dataset, _filters, _rows, _series):
+    return (
+        analytics.distinct_counts(_dataset, _filters, _rows),
+        analytics.distinct_deltas(_dataset, _filters, comparison_mode, _series),
+    )
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def distinct_table(filter_state, by, _dataset, _filters, _rows):
+    return analytics.distinct_by(_dataset, _filters, by, _rows)
+
+# Approximate mode answers from the dataset's stratified sample while the
+# exact aggregates are computed in the background; the page reruns and swaps
+# them in once they are ready
+
+@st.cache_resource
+def background_results():
+    return BackgroundResults()
+
+def exact_selection(dataset, filters, rows):
+    return analytics.aggregates(dataset, filters, rows, comparison=None), analytics.describe_selection(dataset, rows)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def selection_estimate(filter_state, _dataset, _filters):
+    return _dataset.sample.estimate(_filters, comparison=None)
+
+# Figures come from one process-wide charts.FigureCache. Charts of aggregated
+# tables are keyed by a digest of the table, so any selection with the same
+# table reuses the figure; row-level charts are keyed by the view state. A hit
+# hands back the built figure itself, nothing is rebuilt or unpickled
+
+@st.cache_resource
+def figure_cache():
+    return charts.FigureCache()
+
+def overview_figures(view_state, large_threshold, aggs, df, rows):
+    figures, errors = figure_cache(), aggs.get("errors", {})
+    return (
+        figures.draw(charts.category_sales_bar, aggs["sales_by_category"], errors.get("sales_by_category")),
+        figures.draw(charts.region_pie, aggs["sales_by_region"]),
+        figures.figure(
+            "sales_profit_scatter", (view_state, large_threshold),
+            lambda: charts.sales_profit_scatter(df.iloc[rows], large_threshold)
+        ),
+        figures.draw(charts.category_margin_bar, aggs["profit_margin_by_cat"]),
+    )
+
+def trends_figures(aggs):
+    figures, errors = figure_cache(), aggs.get("errors", {})
+    return (
+        figures.draw(charts.monthly_trend_line, aggs["monthly_sales"], errors.get("monthly_sales")),
+        figures.draw(charts.quarterly_bar, aggs["quarterly_data"]),
+    )
+
+def geographic_figures(aggs):
+    figures, errors = figure_cache(), aggs.get("errors", {})
+    return (
+        figures.draw(charts.regional_sales_bar, aggs["regional_performance"], errors.get("regional_performance")),
+        figures.draw(charts.regional_margin_bar, aggs["regional_performance"]),
+    )
+
+# One rollup per filter state; drilling down only looks nodes up in it
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def geo_rollup(view_state, _df, _rows, _weights):
+    return GeoRollup(_df[GEO_LEVELS + ["Sales", "Profit"]].iloc[_rows], _weights)
+
+def drilldown_map(rollup, region):
+    return figure_cache().draw(charts.state_choropleth, rollup.state_map(region))
+
+def performance_figures(view_state, large_threshold, aggs, df, rows, workers=None):
+    figures = figure_cache()
+    if "sales_histogram" in aggs:
+        fig_dist = figures.draw(charts.binned_sales_histogram, *aggs["sales_histogram"])
+    else:
+        fig_dist = figures.figure(
+            "sales_histogram", (view_state, large_threshold),
+            lambda: charts.sales_histogram(df.iloc[rows], large_threshold, workers)
+        )
+    return figures.draw(charts.discount_impact_bar, aggs["discount_impact"]), fig_dist
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def deep_dive_summary(filter_state, _dataset, _rows):
+    return analytics.describe_selection(_dataset, _rows)
+
+# Row ids of the Raw Data Viewer: the selection, narrowed by the search and in
+# the chosen order. A resource cache hands back the array itself, so paging
+# through a large selection is a slice with no copy
+
+@st.cache_resource(max_entries=8, show_spinner="Sorting rows...")
+def viewer_rows(filter_state, search_term, sort_column, descending, _dataset, _rows):
+    rows = _rows
+    if search_term:
+        rows = np.intersect1d(_dataset.search_index.search(search_term), rows, assume_unique=True)
+    if sort_column is not None:
+        rows = _dataset.sort_index.sort_rows(rows, sort_column, ascending=not descending)
+    return rows
+
+# Cache warming
+# Right after a dataset loads, one background job runs the functions above for
+# the default selection and the filter sets used most on that dataset in recent
+# sessions, tab by tab, and again whenever those sets change. A session asking
+# for an entry the job is still computing waits for it instead of computing it
+# again
+
+@st.cache_resource(max_entries=8)
+def filter_history(data_key):
+    return FilterHistory()
+
+@st.cache_resource
+def warm_jobs():
+    return BackgroundResults(workers=1, name="sales-warm")
+
+def warm_selection(data_key, dataset, filters):
+    rows = analytics.select_rows(dataset, filters)
+    if len(rows) == 0:
+        return
+    filter_state = (data_key,) + analytics.filter_key(filters)
+    aggs = selection_aggregates(filter_state, dataset, filters, rows)
+    series = selection_series((data_key,) + analytics.filter_key(dict(filters, date_range=None)), dataset, filters)
+    selection_distinct(filter_state, DEFAULT_COMPARISON, dataset, filters, rows, series)
+    overview_figures(filter_state, charts.LARGE_SELECTION_ROWS, aggs, dataset.df, rows)
+    trends_figures(aggs)
+    geographic_figures(aggs)
+    if has_geography(dataset.df):
+        drilldown_map(geo_rollup(filter_state, dataset.df, rows, None), None)
+    performance_figures(filter_state, charts.LARGE_SELECTION_ROWS, aggs, dataset.df, rows, dataset.workers)
+    deep_dive_summary(filter_state, dataset, rows)
+    distinct_table(filter_state, DISTINCT_GROUPS[0], dataset, filters, rows)
+
+def warm_caches(data_key, dataset, plan):
+    for filters in plan:
+        warm_selection(data_key, dataset, filters)
+    return len(plan)
+
+def format_delta(delta):
+    return f"{delta:+.1f}%" if delta is not None else None
+
+def show_interval(intervals, key, template):
+    # 95% half-width under a tile showing an estimate
+    if intervals is not None and intervals.get(key) is not None:
+        st.caption(template.format(intervals[key]) + " (95%)")
+
+def show_kpis(kpis, intervals=None):
+    col1, col2, col3, col4, col5, col6 = st.columns(6)
+    approx = "≈" if intervals is not None else ""
+    # Distinct counts are exact next to a sample estimate, unless they come
+    # from the HyperLogLog sketches of a large dataset
+    sketched = "≈" if kpis.get("distinct_estimated") else ""
+    orders_approx = sketched or (approx if intervals is not None and intervals.get("total_orders") is not None else "")
+    per_order_approx = approx or sketched
+    
+    with col1:
+        st.metric(
+            " Total Sales",
+            f"{approx}${kpis['total_sales']:,.0f}",
+            delta=format_delta(kpis['sales_delta'])
+        )
+        show_interval(intervals, "total_sales", "±${:,.0f}")
+    
+    with col2:
+        st.metric(
+            " Total Profit",
+            f"{approx}${kpis['total_profit']:,.0f}",
+            delta=format_delta(kpis['profit_delta'])
+        )
+        show_interval(intervals, "total_profit", "±${:,.0f}")
+    
+    with col3:
+        st.metric(
+            " Profit Margin",
+            f"{approx}{kpis['profit_margin']:.1f}%"
+        )
+        show_interval(intervals, "profit_margin", "±{:.1f} pts")
+    
+    with col4:
+        st.metric(
+            " Avg Order Value",
+            f"{per_order_approx}${kpis['avg_order_value']:.0f}"
+        )
+        show_interval(intervals, "avg_order_value", "±${:,.0f}")
+    
+    with col5:
+        st.metric(
+            " Total Orders",
+            f"{orders_approx}{kpis['total_orders']:,}",
+            delta=format_delta(kpis.get('orders_delta')),
+            help=f"Distinct Order IDs ({kpis['line_items']:,.0f} line items)" if "line_items" in kpis else None
+        )
+        show_interval(intervals, "total_orders", "±{:,.0f}")
+    
+    with col6:
+        st.metric(
+            " Avg Discount",
+            f"{approx}{kpis['avg_discount']:.1f}%"
+        )
+        show_interval(intervals, "avg_discount", "±{:.1f} pts")
+    
+    # Customer metrics, when the data has customer IDs
+    
+    if "unique_customers" in kpis:
+        col1, col2, col3, col4, _, _ = st.columns(6)
+        col1.metric(" Customers", f"{sketched}{kpis['unique_customers']:,}", delta=format_delta(kpis.get('customers_delta')))
+        col2.metric(" Sales per Customer", f"{per_order_approx}${kpis['sales_per_customer']:,.0f}")
+        col3.metric(" Orders per Customer", f"{orders_approx}{kpis['orders_per_customer']:.2f}")
+        if "unique_products" in kpis:
+            col4.metric(" Products Sold", f"{sketched}{kpis['unique_products']:,}")
+    if sketched:
+        st.caption(
+            "≈ Orders, customers and products estimated from HyperLogLog sketches "
+            f"(within ±{2 * HLL_ERROR:.1%} at 95% confidence)."
+        )
+    
+    if kpis.get("comparison_start") is not None:
+        window = f"{kpis['comparison_start']:%Y-%m-%d} to {kpis['comparison_end']:%Y-%m-%d}"
+        if kpis["sales_delta"] is None:
+            st.caption(f"No orders in the comparison window ({kpis['comparison']}: {window}).")
+        else:
+            st.caption(f"Changes are measured against {window} ({kpis['comparison'].lower()}).")
+
+def show_aggregate_view(bounds, fetch_aggregates, caption, comparison=False):
+    
+    # Aggregate-only view: filters and charts are answered by a backend that
+    # returns chart tables, never rows
+    
+    if bounds["rows"] == 0:
+        st.warning("🚨 No data matches the selected filters!")
+        st.stop()
+    
+    st.sidebar.markdown("### 🔍 Filter Controls")
+    min_date = bounds["min_date"].date()
+    max_date = bounds["max_date"].date()
+    date_range = st.sidebar.date_input(
+        " Date Range",
+        value=[min_date, max_date],
+        min_value=min_date,
+        max_value=max_date
+    )
+    region = st.sidebar.multiselect(" Select Region:", options=bounds["regions"], default=bounds["regions"])
+    category = st.sidebar.multiselect(" Select Category:", options=bounds["categories"], default=bounds["categories"])
+    sales_bounds = (float(bounds["min_sales"]), float(bounds["max_sales"]))
+    sales_range = st.sidebar.slider(
+        " Sales Range",
+        min_value=sales_bounds[0],
+        max_value=sales_bounds[1],
+        value=sales_bounds,
+        format="$%.0f"
+    )
+    comparison_mode = st.sidebar.selectbox(
+        " Compare With:", COMPARISON_MODES, index=COMPARISON_MODES.index(DEFAULT_COMPARISON)
+    ) if comparison else None
+    
+    aggs = fetch_aggregates(
+        sales_bounds,
+        tuple(date_range) if len(date_range) == 2 else None,
+        tuple(region), tuple(category), tuple(sales_range),
+        comparison_mode
+    )
+    if aggs is None:
+        st.warning("🚨 No data matches the selected filters!")
+        st.stop()
+    
+    st.markdown("---")
+    show_kpis(aggs["kpis"])
+    st.markdown("---")
+    st.caption(caption)
+    
+    tab1, tab2, tab3, tab4 = st.tabs([" Overview", " Trends", " Geographic", " Performance"])
+    
+    with tab1:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.plotly_chart(charts.category_sales_bar(aggs["sales_by_category"]), use_container_width=True)
+        with col2:
+            st.plotly_chart(charts.region_pie(aggs["sales_by_region"]), use_container_width=True)
+        with col3:
+            st.plotly_chart(charts.category_margin_bar(aggs["profit_margin_by_cat"]), use_container_width=True)
+    
+    with tab2:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.plotly_chart(charts.monthly_trend_line(aggs["monthly_sales"]), use_container_width=True)
+        with col2:
+            st.plotly_chart(charts.quarterly_bar(aggs["quarterly_data"]), use_container_width=True)
+    
+    with tab3:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.plotly_chart(charts.regional_sales_bar(aggs["regional_performance"]), use_container_width=True)
+        with col2:
+            st.plotly_chart(charts.regional_margin_bar(aggs["regional_performance"]), use_container_width=True)
+        st.subheader(" Regional Performance Summary")
+        st.dataframe(aggs["regional_performance"], use_container_width=True)
+    
+    with tab4:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.plotly_chart(charts.discount_impact_bar(aggs["discount_impact"]), use_container_width=True)
+        with col2:
+            st.plotly_chart(charts.binned_sales_histogram(*aggs["sales_histogram"]), use_container_width=True)
+
+def show_streaming_view(file_path):
+    bounds = load_stream_bounds(file_path, file_signature(file_path))
+    
+    def fetch_aggregates(sales_bounds, date_range, regions, categories, sales_range, comparison_mode):
+        return load_stream_aggregates(
+            file_path, file_signature(file_path), sales_bounds, date_range, regions, categories, sales_range
+        )
+    
+    show_aggregate_view(
+        bounds, fetch_aggregates,
+        f"Streamed {bounds['rows']:,} rows in chunks; row-level views are disabled in out-of-core mode."
+    )
+
+def show_sql_view(file_path):
+    db_path = load_sql_database(file_path, file_signature(file_path))
+    bounds = load_sql_bounds(str(db_path))
+    
+    def fetch_aggregates(sales_bounds, date_range, regions, categories, sales_range, comparison_mode):
+        return load_sql_aggregates(
+            str(db_path), sales_bounds, date_range, regions, categories,
+            None if sales_range == sales_bounds else sales_range, comparison_mode
+        )
+    
+    show_aggregate_view(
+        bounds, fetch_aggregates,
+        f"Queried {bounds['rows']:,} rows in SQLite ({db_path.name}); row-level views are disabled with the SQL backend.",
+        comparison=True
+    )
 
 # Header with animation
 st.markdown('<h1 class="main-header">EXECUTIVE SALES DASHBOARD</h1>', unsafe_allow_html=True)
@@ -134,80 +575,282 @@ st.markdown('<p class="subtitle">Real-time Business Intelligence & Performance A
 
 data_source = st.radio("Choose Data Source:", ["Upload File", "Use Sample Data", "Default File"], horizontal=True)
 
-df = None
+df, data_key, dataset = None, None, None
 if data_source == "Upload File":
     uploaded_file = st.file_uploader("Upload your sales data", type=['csv', 'xlsx'])
     if uploaded_file is not None:
-        df = load_data(uploaded_file=uploaded_file)
-        st.success("✅ Data uploaded successfully!")
+        sheet = None
+        if is_excel(uploaded_file):
+            sheets = list_sheets(uploaded_file)
+            if len(sheets) > 1:
+                sheet = st.selectbox("Sheet:", sheets)
+        with profile.span("load_data"):
+            df, data_key = load_data(uploaded_file=uploaded_file, sheet=sheet)
+        if df is not None:
+            st.success("✅ Data uploaded successfully!")
 elif data_source == "Use Sample Data":
-    df = load_data()
+    with profile.span("load_data"):
+        df, data_key = load_data()
     st.info("📊 Using sample data for demonstration")
 else:
-    try:
-        df = load_data("superstore.csv")
-    except:
-        st.warning("⚠️ Default file not found. Using sample data instead.")
-        df = load_data()
+    backend = st.radio(
+        "Backend:",
+        ["In memory", "🌊 Out-of-core", "🗄️ SQL (SQLite)"],
+        horizontal=True,
+        help="Out-of-core streams the file in chunks for files larger than RAM. SQL loads it once into an "
+             "indexed SQLite file and pushes filters and aggregations into queries."
+    )
+    if backend == "🌊 Out-of-core":
+        show_streaming_view("superstore.csv")
+        st.stop()
+    if backend == "🗄️ SQL (SQLite)":
+        show_sql_view("superstore.csv")
+        st.stop()
+    live = st.checkbox(
+        "🔄 Live refresh",
+        help="Watch the file for appended rows and merge only those into the loaded data."
+    )
+    with profile.span("load_data"):
+        try:
+            if live:
+                source = live_source("superstore.csv")
+                with st.spinner("Reading new rows..."):
+                    source.refresh()
+                dataset = source.dataset
+                df, data_key = dataset.df, dataset.key
+            else:
+                df, data_key = load_data("superstore.csv", signature=file_signature("superstore.csv"))
+        except:
+            st.warning("⚠️ Default file not found. Using sample data instead.")
+            live, dataset = False, None
+            df, data_key = load_data()
+    
+    if live:
+        refresh_seconds = st.select_slider(
+            "Check for new rows every",
+            options=[10, 30, 60, 120, 300],
+            value=60,
+            format_func=lambda s: f"{s}s"
+        )
+        
+        # Polls the file size; only a grown file triggers a full rerun
+        
+        @st.fragment(run_every=refresh_seconds)
+        def watch_source():
+            if source.has_new_data():
+                st.rerun()
+            st.caption(
+                f"Live: {len(source.dataset.df):,} rows, {source.appended_rows:,} appended since load · "
+                f"checked {datetime.now():%H:%M:%S}"
+            )
+        
+        watch_source()
 
 if df is None:
     st.stop()
 
+# Optionally keep only the columns some view computes on. Cached frames stay
+# whole, so the column memory report can compare against them
+
+full_columns = df
+drop_unused = dataset is None and st.session_state.get("drop_unused_columns", False)
+if drop_unused:
+    df = schema.drop_unused(df)
+    data_key = f"{data_key}:dashboard-columns"
+
+with profile.span("index"):
+    if dataset is None:
+        dataset = load_dataset_handle(data_key, df)
+    engine = dataset.engine
+
+# Warm the caches for this dataset in the background, once per data version
+# and set of most-used filters
+
+plan = warm_plan(engine, filter_history(data_key))
+warm_job = warm_jobs().submit(
+    ("warm", data_key, frozenset(map(analytics.filter_key, plan))), warm_caches, data_key, dataset, plan
+)
+
+# Per-run view
+# A shallow copy shares every column with the process-wide frame. Columns a
+# run adds or replaces are copy-on-write, so they stay in this view and the
+# shared data is never copied or changed
+
+df_full = dataset.df.copy(deep=False)
+
 # Advanced Sidebar Filters
 
+DIMENSION_KEYS = {dim: key for key, dim in DIMENSION_FILTERS.items()}
+
 st.sidebar.markdown("### 🔍 Filter Controls")
 
 # Date range filter
 
-if 'Order Date' in df.columns:
-    min_date = df['Order Date'].min().date()
-    max_date = df['Order Date'].max().date()
-    date_range = st.sidebar.date_input(
-        " Date Range",
-        value=[min_date, max_date],
-        min_value=min_date,
-        max_value=max_date
-    )
-    
-    # Apply date filter
-    
-    if len(date_range) == 2:
-        start_date, end_date = date_range
-        df = df[(df['Order Date'].dt.date >= start_date) & 
-                (df['Order Date'].dt.date <= end_date)]
+selected_dates = None
+min_date = pd.Timestamp(engine.sorted_dates[0]).date()
+max_date = pd.Timestamp(engine.sorted_dates[-1]).date()
+date_range = st.sidebar.date_input(
+    " Date Range",
+    value=[min_date, max_date],
+    min_value=min_date,
+    max_value=max_date
+)
+
+# Apply date filter
+
+if len(date_range) == 2:
+    selected_dates = tuple(date_range)
+with profile.span("date_filter"):
+    date_bitmap = engine.date_bitmap(selected_dates)
+
+if not date_bitmap.any():
+    st.warning("🚨 No data matches the selected filters!")
+    st.stop()
+
+# Faceted filters
+# Every option shows the rows and Sales it would select given the dates, the
+# Sales range and the other dimensions' selections, so a dead end reads 0
+# before it is picked. Selections are read from widget state first, because
+# the Sales bounds depend on them and the counts on the Sales range; the
+# containers keep the widgets in sidebar order all the same
+
+main_filters = st.sidebar.container()
+sales_filter_area = st.sidebar.container()
+more_filters = st.sidebar.expander("➕ More filters")
+
+facet_dims = [(dim, label, area, empty_is_all) for dim, label, area, empty_is_all in [
+    ("Region", " Select Region:", main_filters, False),
+    ("Category", " Select Category:", main_filters, False),
+    ("Segment", "Segment:", more_filters, True),
+    ("Ship Mode", "Ship Mode:", more_filters, True),
+    ("State", "State:", more_filters, True),
+    ("Sub-Category", "Sub-Category:", more_filters, True),
+] if dim in engine.codes]
 
-# Multi-select filters
+def facet_selection(dim, values, empty_is_all):
+    # None when the selection keeps every row, so it does not filter
+    if values is None or len(values) == len(engine.values[dim]) or (empty_is_all and not values):
+        return None
+    return list(values)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def facet_counts(facet_state, _engine, date_range, selections, sales_range):
+    return _engine.facets(date_range, selections, sales_range)
+
+with profile.span("facets"):
+    selections = {
+        dim: facet_selection(dim, st.session_state.get(f"filter_{dim}"), empty_is_all)
+        for dim, _, _, empty_is_all in facet_dims
+    }
+    selection_bitmap = date_bitmap.copy()
+    for dim, values in selections.items():
+        if values is not None:
+            np.bitwise_and(selection_bitmap, engine.dimension_bitmap(dim, values), out=selection_bitmap)
+
+# Sales range filter
 
-region = st.sidebar.multiselect(
-    " Select Region:",
-    options=df["Region"].unique(),
-    default=df["Region"].unique()
+sales_bounds = engine.sales_bounds(selection_bitmap if selection_bitmap.any() else date_bitmap)
+sales_range = sales_filter_area.slider(
+    " Sales Range",
+    min_value=sales_bounds[0],
+    max_value=sales_bounds[1],
+    value=sales_bounds,
+    format="$%.0f"
 )
+sales_filter = None if sales_range == sales_bounds else sales_range
+
+with profile.span("facets"):
+    facets = facet_counts(
+        (data_key,) + analytics.filter_key({
+            "date_range": selected_dates,
+            **{DIMENSION_KEYS[dim]: values for dim, values in selections.items()},
+            "sales_range": sales_filter,
+        }),
+        engine, selected_dates, selections, sales_filter
+    )
+
+for dim, label, area, empty_is_all in facet_dims:
+    counts, sales = facets[dim]
+    position = {value: i for i, value in enumerate(engine.values[dim])}
+    options = sorted(engine.values[dim], key=str)
+    values = area.multiselect(
+        label,
+        options=options,
+        default=[] if empty_is_all else options,
+        key=f"filter_{dim}",
+        placeholder="All" if empty_is_all else "Choose options",
+        format_func=lambda v, counts=counts, sales=sales, position=position:
+            f"{v} · {counts[position[v]]:,} · ${sales[position[v]]:,.0f}"
+    )
+    selections[dim] = facet_selection(dim, values, empty_is_all)
 
-category = st.sidebar.multiselect(
-    " Select Category:",
-    options=df["Category"].unique(),
-    default=df["Category"].unique()
+# Comparison window for the KPI deltas
+
+comparison_mode = st.sidebar.selectbox(
+    " Compare With:",
+    COMPARISON_MODES,
+    index=COMPARISON_MODES.index(DEFAULT_COMPARISON),
+    help="Window the KPI changes are measured against. Rolling windows compare the last 30/90 days of the selection with the 30/90 days before."
 )
 
-# Sales range filter
+# Rendering options
 
-if not df.empty:
-    sales_range = st.sidebar.slider(
-        " Sales Range",
-        min_value=float(df["Sales"].min()),
-        max_value=float(df["Sales"].max()),
-        value=(float(df["Sales"].min()), float(df["Sales"].max())),
-        format="$%.0f"
+with st.sidebar.expander("⚙️ Rendering"):
+    large_threshold = st.number_input(
+        "Large-selection threshold (rows)",
+        min_value=1_000,
+        value=charts.LARGE_SELECTION_ROWS,
+        step=10_000,
+        help="Above this many rows the scatter is density-sampled and drawn with WebGL, and the histogram is pre-binned."
     )
 
-# Apply filters
+@st.cache_data(max_entries=4, show_spinner="Measuring columns...")
+def column_memory(data_key, _df, dropped):
+    return schema.memory_report(_df, dropped)
 
-df_selection = df.query(
-    "Region == @region & Category == @category & Sales >= @sales_range[0] & Sales <= @sales_range[1]"
+with st.sidebar.expander("🧮 Memory"):
+    st.checkbox(
+        "Drop columns no view uses",
+        key="drop_unused_columns",
+        help="Frees the memory of columns the KPIs, filters, charts and search never read. The Raw Data Viewer and exports then only show the kept columns."
+    )
+    if st.toggle("Show column memory report"):
+        dropped = tuple(schema.unused_columns(full_columns)) if drop_unused else ()
+        report = column_memory(data_key, full_columns, dropped)
+        st.dataframe(report, hide_index=True, use_container_width=True)
+        total = report.iloc[-1]
+        st.caption(
+            f"{total['Before (bytes)'] / 1e6:,.1f} MB as plain strings and 64-bit numbers, "
+            f"{total['After (bytes)'] / 1e6:,.1f} MB loaded."
+        )
+
+approximate = st.sidebar.checkbox(
+    "≈ Approximate mode",
+    help="Answer from a stratified sample first, with 95% intervals, while the exact results are computed in the background."
 )
 
-if df_selection.empty:
+show_performance = st.sidebar.checkbox(
+    "⏱ Performance panel",
+    help="Show how long each stage of the last rerun took and how much memory it added."
+)
+
+# Apply filters
+
+# A Sales range left at its bounds does not filter, so the cube can answer
+
+filters = {
+    "date_range": selected_dates,
+    **{DIMENSION_KEYS[dim]: values for dim, values in selections.items()},
+    "sales_range": sales_filter,
+}
+filter_state = (data_key,) + analytics.filter_key(filters)
+if st.session_state.get("recorded_filter_state") != filter_state:
+    filter_history(data_key).record(filters)
+    st.session_state["recorded_filter_state"] = filter_state
+with profile.span("filter"):
+    selected_rows = analytics.select_rows(dataset, filters)
+
+if len(selected_rows) == 0:
     st.warning("🚨 No data matches the selected filters!")
     st.stop()
 
@@ -215,329 +858,228 @@ if df_selection.empty:
 
 st.markdown("---")
 
-# Calculate metrics
+# The tiles' place is held while the aggregates are computed (or awaited from
+# the warming job)
 
-total_sales = df_selection["Sales"].sum()
-total_profit = df_selection["Profit"].sum()
-avg_discount = df_selection["Discount"].mean() * 100
-profit_margin = (total_profit / total_sales * 100) if total_sales > 0 else 0
-total_orders = len(df_selection)
-avg_order_value = total_sales / total_orders if total_orders > 0 else 0
+kpi_slot = st.empty()
+kpi_slot.caption("⏳ Computing KPIs…")
 
-# Calculate deltas (comparing with previous period)
+exact, exact_job = None, None
+if approximate:
+    exact_job = background_results().submit(filter_state, exact_selection, dataset, filters, selected_rows)
+    if exact_job.done():
+        exact = exact_job.result()
 
-if 'Order Date' in df_selection.columns and len(df_selection) > 0:
-    current_period = df_selection[df_selection['Order Date'] >= df_selection['Order Date'].quantile(0.5)]
-    previous_period = df_selection[df_selection['Order Date'] < df_selection['Order Date'].quantile(0.5)]
-    
-    sales_delta = ((current_period['Sales'].sum() - previous_period['Sales'].sum()) / 
-                   previous_period['Sales'].sum() * 100) if previous_period['Sales'].sum() > 0 else 0
-    
-    profit_delta = ((current_period['Profit'].sum() - previous_period['Profit'].sum()) / 
-                    previous_period['Profit'].sum() * 100) if previous_period['Profit'].sum() > 0 else 0
-else:
-    sales_delta = 0
-    profit_delta = 0
-
-# Display KPIs
+with profile.span("aggregates"):
+    estimated = approximate and exact is None
+    if estimated:
+        with st.spinner("Drawing the sample..."):
+            aggs = selection_estimate(filter_state, dataset, filters)
+        estimated = aggs is not None
+    if not estimated:
+        aggs = exact[0] if exact is not None else selection_aggregates(filter_state, dataset, filters, selected_rows)
 
-col1, col2, col3, col4, col5, col6 = st.columns(6)
+with profile.span("period_comparison"):
+    if estimated:
+        series = dataset.sample.daily_series(filters)
+    else:
+        series = selection_series(
+            (data_key,) + analytics.filter_key(dict(filters, date_range=None)), dataset, filters
+        )
+    comparison = analytics.compare_periods(dataset, filters, comparison_mode, series)
 
-with col1:
-    st.metric(
-        " Total Sales",
-        f"${total_sales:,.0f}",
-        delta=f"{sales_delta:+.1f}%"
+with profile.span("distinct_counts"):
+    distinct_counts, distinct_deltas = selection_distinct(
+        filter_state, comparison_mode, dataset, filters, selected_rows, series
     )
 
-with col2:
-    st.metric(
-        " Total Profit",
-        f"${total_profit:,.0f}",
-        delta=f"{profit_delta:+.1f}%"
-    )
+kpis = analytics.order_kpis({**aggs["kpis"], **comparison, **distinct_deltas}, distinct_counts)
+total_sales = kpis["total_sales"]
+total_profit = kpis["total_profit"]
+profit_margin = kpis["profit_margin"]
+total_orders = kpis["total_orders"]
+avg_order_value = kpis["avg_order_value"]
 
-with col3:
-    st.metric(
-        " Profit Margin",
-        f"{profit_margin:.1f}%"
-    )
-
-with col4:
-    st.metric(
-        " Avg Order Value",
-        f"${avg_order_value:.0f}"
-    )
+# Figures drawn from estimates are cached apart from the exact ones, and the
+# row-level charts use the sampled rows
 
-with col5:
-    st.metric(
-        " Total Orders",
-        f"{total_orders:,}"
-    )
+view_state = filter_state + ("estimate",) if estimated else filter_state
+view_df, view_rows = (dataset.sample.rows, aggs["sample_rows"]) if estimated else (df_full, selected_rows)
 
-with col6:
-    st.metric(
-        " Avg Discount",
-        f"{avg_discount:.1f}%"
-    )
+# Display KPIs
 
-st.markdown("---")
+# Orders are counted, not estimated, so only Avg Order Value keeps the
+# Sales interval
 
-# Tabbed Interface for Charts
+intervals = None
+if estimated:
+    intervals = dict(aggs["intervals"])
+    if "orders" in distinct_counts:
+        intervals["total_orders"] = None
+        intervals["avg_order_value"] = intervals["total_sales"] / max(distinct_counts["orders"], 1)
 
-tab1, tab2, tab3, tab4, tab5 = st.tabs([" Overview", " Trends", " Geographic", " Performance", " Deep Dive"])
+with kpi_slot.container():
+    show_kpis(kpis, intervals)
 
-with tab1:
-    col1, col2 = st.columns(2)
+if estimated:
     
-    with col1:
-        
-        # Enhanced Sales by Category
-        
-        sales_by_category = df_selection.groupby("Category")["Sales"].sum().reset_index()
-        fig_category = px.bar(
-            sales_by_category,
-            x="Category",
-            y="Sales",
-            title=" Sales Performance by Category",
-            color="Category",
-            color_discrete_sequence=px.colors.qualitative.Set3
-        )
-        fig_category.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(size=12),
-            title_font_size=16
-        )
-        st.plotly_chart(fig_category, use_container_width=True)
+    # Polls the background job; a finished one triggers a full rerun
     
-    with col2:
-        
-        # Enhanced Sales by Region
-        
-        sales_by_region = df_selection.groupby("Region")["Sales"].sum().reset_index()
-        fig_region = px.pie(
-            sales_by_region,
-            names="Region",
-            values="Sales",
-            title=" Revenue Distribution by Region",
-            color_discrete_sequence=px.colors.qualitative.Pastel
+    @st.fragment(run_every=1)
+    def await_exact():
+        if exact_job.done():
+            st.rerun()
+        st.caption(
+            f"≈ Estimated from a {len(dataset.sample):,}-row stratified sample (Region × Category × month) "
+            "with 95% intervals · exact results are loading…"
         )
-        fig_region.update_traces(textposition='inside', textinfo='percent+label')
-        fig_region.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(size=12),
-            title_font_size=16
+    
+    await_exact()
+
+st.markdown("---")
+
+# Tab views
+# Each tab gets its figures from its own function, through the figure cache,
+# and is only run while it is the selected tab. The Deep Dive tab is a
+# fragment so its search and pagination widgets rerun that tab alone
+
+def lazy_tabs(labels, key):
+    if "on_change" in inspect.signature(st.tabs).parameters:
+        return st.tabs(labels, key=key, on_change="rerun")
+    return st.tabs(labels)
+
+def tab_is_open(tab):
+    # Streamlit versions without stateful tabs render every tab
+    return getattr(tab, "open", None) is not False
+
+def overview_tab():
+    slot_category, slot_region, slot_scatter, slot_margin = chart_slots(4)
+    with profile.span("figures:overview"):
+        fig_category, fig_region, fig_scatter, fig_margin = overview_figures(
+            view_state, large_threshold, aggs, view_df, view_rows
         )
-        st.plotly_chart(fig_region, use_container_width=True)
+    
+    # Enhanced Sales by Category
+    
+    plotly_chart(fig_category, "category_sales", slot_category)
+    
+    # Enhanced Sales by Region
+    
+    plotly_chart(fig_region, "region_share", slot_region)
     
     # Profit vs Sales Scatter
     
-    col3, col4 = st.columns(2)
+    plotly_chart(fig_scatter, "sales_profit", slot_scatter)
     
-    with col3:
-        fig_scatter = px.scatter(
-            df_selection,
-            x="Sales",
-            y="Profit",
-            color="Category",
-            size="Discount",
-            title=" Sales vs Profit Analysis",
-            hover_data=["Region"]
-        )
-        fig_scatter.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(size=12),
-            title_font_size=16
-        )
-        st.plotly_chart(fig_scatter, use_container_width=True)
+    # Top performing categories by profit margin
     
-    with col4:
-        
-        # Top performing categories by profit margin
-        
-        profit_margin_by_cat = df_selection.groupby("Category").apply(
-            lambda x: x["Profit"].sum() / x["Sales"].sum() * 100 if x["Sales"].sum() > 0 else 0
-        ).reset_index()
-        profit_margin_by_cat.columns = ["Category", "Profit Margin"]
-        
-        fig_margin = px.bar(
-            profit_margin_by_cat,
-            x="Category",
-            y="Profit Margin",
-            title=" Profit Margin by Category",
-            color="Profit Margin",
-            color_continuous_scale="RdYlGn"
-        )
-        fig_margin.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(size=12),
-            title_font_size=16
-        )
-        st.plotly_chart(fig_margin, use_container_width=True)
+    plotly_chart(fig_margin, "category_margin", slot_margin)
 
-with tab2:
-    if 'Order Date' in df_selection.columns:
-        
-        # Monthly trend
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            monthly_sales = df_selection.groupby(df_selection["Order Date"].dt.to_period("M"))["Sales"].sum().reset_index()
-            monthly_sales["Order Date"] = monthly_sales["Order Date"].astype(str)
-            
-            fig_trend = px.line(
-                monthly_sales,
-                x="Order Date",
-                y="Sales",
-                title=" Monthly Sales Trend",
-                markers=True
-            )
-            fig_trend.update_traces(line_color='#667eea', marker_color='#764ba2')
-            fig_trend.update_layout(
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(size=12),
-                title_font_size=16
-            )
-            st.plotly_chart(fig_trend, use_container_width=True)
-        
-        with col2:
-            
-            # Quarterly comparison
-            
-            df_selection['Quarter'] = df_selection['Order Date'].dt.to_period('Q').astype(str)
-            quarterly_data = df_selection.groupby(['Quarter', 'Category'])['Sales'].sum().reset_index()
-            
-            fig_quarterly = px.bar(
-                quarterly_data,
-                x="Quarter",
-                y="Sales",
-                color="Category",
-                title=" Quarterly Sales by Category",
-                barmode="stack"
-            )
-            fig_quarterly.update_layout(
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(size=12),
-                title_font_size=16
-            )
-            st.plotly_chart(fig_quarterly, use_container_width=True)
-
-with tab3:
+def trends_tab():
+    slot_trend, slot_quarterly = chart_slots(2)
+    with profile.span("figures:trends"):
+        fig_trend, fig_quarterly = trends_figures(aggs)
     
-    # Geographic analysis
+    # Monthly trend
     
-    regional_performance = df_selection.groupby("Region").agg({
-        "Sales": "sum",
-        "Profit": "sum",
-        "Order Date": "count"
-    }).reset_index()
-    regional_performance.columns = ["Region", "Total Sales", "Total Profit", "Order Count"]
-    regional_performance["Profit Margin"] = (regional_performance["Total Profit"] / 
-                                           regional_performance["Total Sales"] * 100).round(2)
+    plotly_chart(fig_trend, "monthly_trend", slot_trend)
     
-    col1, col2 = st.columns(2)
+    # Quarterly comparison
     
-    with col1:
-        fig_regional_sales = px.bar(
-            regional_performance,
-            x="Region",
-            y="Total Sales",
-            title=" Sales by Region",
-            color="Total Sales",
-            color_continuous_scale="Blues"
-        )
-        fig_regional_sales.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(size=12),
-            title_font_size=16
-        )
-        st.plotly_chart(fig_regional_sales, use_container_width=True)
+    plotly_chart(fig_quarterly, "quarterly", slot_quarterly)
+
+def geographic_tab():
+    slot_sales, slot_margin = chart_slots(2)
+    with profile.span("figures:geographic"):
+        fig_regional_sales, fig_regional_profit = geographic_figures(aggs)
     
-    with col2:
-        fig_regional_profit = px.bar(
-            regional_performance,
-            x="Region",
-            y="Profit Margin",
-            title=" Profit Margin by Region",
-            color="Profit Margin",
-            color_continuous_scale="RdYlGn"
-        )
-        fig_regional_profit.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(size=12),
-            title_font_size=16
-        )
-        st.plotly_chart(fig_regional_profit, use_container_width=True)
+    # Geographic analysis
+    
+    plotly_chart(fig_regional_sales, "regional_sales", slot_sales)
+    plotly_chart(fig_regional_profit, "regional_margin", slot_margin)
     
     # Regional performance table
     
     st.subheader(" Regional Performance Summary")
-    st.dataframe(regional_performance, use_container_width=True)
-
-with tab4:
+    st.dataframe(aggs["regional_performance"], use_container_width=True)
+    if estimated:
+        st.caption("≈ Estimated from the sample.")
     
-    # Performance analytics
+    # Region -> State -> City drill-down
     
-    col1, col2 = st.columns(2)
+    if has_geography(view_df):
+        with profile.span("figures:geo_rollup"), st.spinner("Rolling up locations..."):
+            rollup = geo_rollup(
+                view_state, view_df, view_rows, dataset.sample.weights[view_rows] if estimated else None
+            )
+        geo_drilldown(rollup)
+
+@st.fragment
+def geo_drilldown(rollup):
+    st.subheader("🗺️ Drill-down")
     
+    col1, col2 = st.columns(2)
     with col1:
-        
-        # Discount impact analysis
-        
-        discount_bins = pd.cut(df_selection['Discount'], bins=5, labels=['0-10%', '10-20%', '20-30%', '30-40%', '40-50%'])
-        discount_impact = df_selection.groupby(discount_bins).agg({
-            'Sales': 'mean',
-            'Profit': 'mean'
-        }).reset_index()
-        
-        fig_discount = px.bar(
-            discount_impact,
-            x='Discount',
-            y=['Sales', 'Profit'],
-            title="🏷 Impact of Discounts on Performance",
-            barmode='group'
+        region = st.selectbox(
+            "Region:",
+            [None] + rollup.children()["Region"].tolist(),
+            format_func=lambda r: "All regions" if r is None else r
         )
-        fig_discount.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(size=12),
-            title_font_size=16
+    states = rollup.children(region) if region is not None else None
+    with col2:
+        state = st.selectbox(
+            "State:",
+            [None] + (states["State"].tolist() if states is not None else []),
+            format_func=lambda s: "All states" if s is None else s,
+            disabled=region is None
         )
-        st.plotly_chart(fig_discount, use_container_width=True)
+    
+    col1, col2 = st.columns([3, 2])
+    
+    with col1:
+        plotly_chart(drilldown_map(rollup, region), "state_map")
     
     with col2:
-        
-        # Sales distribution
-        
-        fig_dist = px.histogram(
-            df_selection,
-            x="Sales",
-            nbins=30,
-            title=" Sales Distribution",
-            color_discrete_sequence=['#667eea']
-        )
-        fig_dist.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(size=12),
-            title_font_size=16
+        if state is not None:
+            st.markdown(f"**Cities in {state}**")
+            st.dataframe(rollup.children(region, state), hide_index=True, use_container_width=True)
+        elif region is not None:
+            st.markdown(f"**States in {region}**")
+            st.dataframe(states, hide_index=True, use_container_width=True)
+        else:
+            st.markdown("**Regions**")
+            st.dataframe(rollup.children(), hide_index=True, use_container_width=True)
+
+def performance_tab():
+    slot_discount, slot_dist = chart_slots(2)
+    with profile.span("figures:performance"):
+        fig_discount, fig_dist = performance_figures(
+            view_state, large_threshold, aggs, view_df, view_rows, dataset.workers
         )
-        st.plotly_chart(fig_dist, use_container_width=True)
+    
+    # Performance analytics
+    
+    # Discount impact analysis
+    
+    plotly_chart(fig_discount, "discount_impact", slot_discount)
+    
+    # Sales distribution
+    
+    plotly_chart(fig_dist, "sales_distribution", slot_dist)
 
-with tab5:
+@st.fragment
+def deep_dive_tab():
     
     # Deep dive analytics
     
     st.subheader(" Detailed Data Analysis")
+    with profile.span("figures:deep_dive"):
+        if estimated:
+            stats_df, avg_discount_profitable = aggs["summary"]
+        elif exact is not None:
+            stats_df, avg_discount_profitable = exact[1]
+        else:
+            stats_df, avg_discount_profitable = deep_dive_summary(filter_state, dataset, selected_rows)
     
     # Statistical summary
     
@@ -545,29 +1087,44 @@ with tab5:
     
     with col1:
         st.subheader(" Statistical Summary")
-        stats_df = df_selection[['Sales', 'Profit', 'Discount']].describe()
         st.dataframe(stats_df, use_container_width=True)
+        if estimated:
+            st.caption("≈ Weighted estimates from the sample.")
     
     with col2:
         st.subheader(" Key Insights")
         
         # Calculate insights
         
-        best_region = df_selection.groupby('Region')['Sales'].sum().idxmax()
-        best_category = df_selection.groupby('Category')['Profit'].sum().idxmax()
-        avg_discount_profitable = df_selection[df_selection['Profit'] > 0]['Discount'].mean() * 100
-        
         insights = [
-            f" **Best performing region**: {best_region}",
-            f" **Most profitable category**: {best_category}",
+            f" **Best performing region**: {aggs['best_region']}",
+            f" **Most profitable category**: {aggs['best_category']}",
             f" **Average discount on profitable sales**: {avg_discount_profitable:.1f}%",
-            f" **Total transactions analyzed**: {len(df_selection):,}",
+            f" **Total transactions analyzed**: {len(selected_rows):,}",
             f" **Overall profit margin**: {profit_margin:.1f}%"
         ]
         
         for insight in insights:
             st.markdown(insight)
     
+    # Orders and customers per group
+    
+    if "orders" in distinct_counts:
+        st.subheader("👥 Orders & Customers")
+        by = st.radio("Per:", DISTINCT_GROUPS, horizontal=True, key="distinct_by")
+        with profile.span("distinct_table"):
+            table = distinct_table(filter_state, by, dataset, filters, selected_rows)
+        st.dataframe(
+            table, hide_index=True, use_container_width=True,
+            column_config={
+                "Sales": st.column_config.NumberColumn(format="$%.0f"),
+                "Sales per Customer": st.column_config.NumberColumn(format="$%.0f"),
+                "Orders per Customer": st.column_config.NumberColumn(format="%.2f"),
+            }
+        )
+        if distinct_counts["estimated"]:
+            st.caption(f"≈ Distinct counts estimated from HyperLogLog sketches (within ±{2 * HLL_ERROR:.1%} at 95% confidence).")
+    
     # Raw data viewer
     
     st.subheader("📋 Raw Data Viewer")
@@ -575,32 +1132,62 @@ with tab5:
     # Search functionality
     
     search_term = st.text_input("🔍 Search in data:", "")
-    if search_term:
-        mask = df_selection.astype(str).apply(lambda x: x.str.contains(search_term, case=False, na=False)).any(axis=1)
-        filtered_df = df_selection[mask]
-    else:
-        filtered_df = df_selection
     
-    # Display data with pagination
+    # Sorting and column choice
+    
+    col1, col2, col3 = st.columns([2, 1, 4])
+    with col1:
+        sort_column = st.selectbox(
+            "Sort by:",
+            [None] + list(df_full.columns),
+            format_func=lambda c: "File order" if c is None else c
+        )
+    with col2:
+        descending = st.toggle("Descending", disabled=sort_column is None)
+    with col3:
+        visible_columns = st.multiselect("Columns:", list(df_full.columns), default=list(df_full.columns))
+    
+    filtered_rows = viewer_rows(filter_state, search_term, sort_column, descending, dataset, selected_rows)
+    
+    # Display data with pagination; only the visible page and columns are gathered
     
     page_size = st.selectbox("Rows per page:", [10, 25, 50, 100], index=1)
     
-    if len(filtered_df) > 0:
-        total_pages = len(filtered_df) // page_size + (1 if len(filtered_df) % page_size > 0 else 0)
+    if len(filtered_rows) > 0:
+        total_pages = len(filtered_rows) // page_size + (1 if len(filtered_rows) % page_size > 0 else 0)
         page = st.number_input("Page:", min_value=1, max_value=total_pages, value=1) - 1
         
         start_idx = page * page_size
         end_idx = start_idx + page_size
         
         st.dataframe(
-            filtered_df.iloc[start_idx:end_idx],
+            df_full.iloc[filtered_rows[start_idx:end_idx], df_full.columns.get_indexer(visible_columns)],
             use_container_width=True
         )
         
-        st.caption(f"Showing {start_idx + 1}-{min(end_idx, len(filtered_df))} of {len(filtered_df)} records")
+        st.caption(f"Showing {start_idx + 1}-{min(end_idx, len(filtered_rows))} of {len(filtered_rows)} records")
     else:
         st.info("No records match your search criteria.")
 
+# Tabbed Interface for Charts
+
+tab1, tab2, tab3, tab4, tab5 = lazy_tabs(
+    [" Overview", " Trends", " Geographic", " Performance", " Deep Dive"],
+    key="active_tab"
+)
+
+for tab, render_tab in [
+    (tab1, overview_tab),
+    (tab2, trends_tab),
+    (tab3, geographic_tab),
+    (tab4, performance_tab),
+    (tab5, deep_dive_tab),
+]:
+    if tab_is_open(tab):
+        with tab:
+            with profile.span(f"tab:{render_tab.__name__}"):
+                render_tab()
+
 # Export Section
 
 st.markdown("---")
@@ -608,31 +1195,44 @@ st.subheader("Export Data")
 
 col1, col2, col3 = st.columns(3)
 
+# Files are built by the download callbacks, only when a download is clicked
+
+export_stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
 with col1:
-    if st.button("Export Filtered Data"):
-        csv = df_selection.to_csv(index=False)
-        st.download_button(
-            label="Download CSV",
-            data=csv,
-            file_name=f"sales_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
-        )
+    export_format = st.selectbox("Format:", list(EXPORT_FORMATS), index=0)
+    extension, mime = EXPORT_FORMATS[export_format]
+    st.download_button(
+        label="Export Filtered Data",
+        data=lambda: export_rows(df_full, selected_rows, export_format),
+        file_name=f"sales_data_{export_stamp}.{extension}",
+        mime=mime
+    )
 
 with col2:
-    if st.button("Export Summary Report"):
-        summary_data = {
+    def summary_report():
+        summary_df = pd.DataFrame({
             'Metric': ['Total Sales', 'Total Profit', 'Profit Margin', 'Total Orders', 'Avg Order Value'],
             'Value': [f"${total_sales:,.0f}", f"${total_profit:,.0f}", f"{profit_margin:.1f}%", 
                      f"{total_orders:,}", f"${avg_order_value:.0f}"]
-        }
-        summary_df = pd.DataFrame(summary_data)
-        csv = summary_df.to_csv(index=False)
-        st.download_button(
-            label="Download Summary",
-            data=csv,
-            file_name=f"sales_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
-        )
+        })
+        return export_workbook({
+            'Summary': summary_df,
+            'Regional Performance': aggs['regional_performance'],
+            'Sales by Category': aggs['sales_by_category'],
+            'Monthly Sales': aggs['monthly_sales'],
+            'Quarterly Sales': aggs['quarterly_data'],
+            'Discount Impact': aggs['discount_impact'],
+        })
+    
+    st.download_button(
+        label="Export Summary Report",
+        data=summary_report,
+        file_name=f"sales_summary_{export_stamp}.xlsx",
+        mime=XLSX_MIME,
+        disabled=estimated,
+        help="Available once the exact results are ready." if estimated else None
+    )
 
 # Footer
 
@@ -646,3 +1246,37 @@ st.markdown(
     unsafe_allow_html=True
 )
 
+# Performance panel
+
+rerun = profile.finish()
+
+if show_performance:
+    with st.sidebar:
+        st.markdown("### ⏱ Performance")
+        st.caption(f"Last rerun {rerun['total_seconds'] * 1000:,.0f} ms · RSS {rerun['rss_mb']:,.0f} MB")
+        st.dataframe(
+            pd.DataFrame({
+                "Stage": [span["name"] for span in rerun["spans"]],
+                "ms": [round(span["seconds"] * 1000, 1) for span in rerun["spans"]],
+                "ΔRSS (MB)": [round(span["rss_delta_mb"], 1) for span in rerun["spans"]],
+            }),
+            hide_index=True,
+            use_container_width=True
+        )
+        figures = memory_figures()
+        st.caption(
+            f"{figures['active_sessions']} active session(s) · shared data "
+            f"{figures['shared_bytes'] / 1e6:,.0f} MB in {figures['shared_datasets']} dataset(s) · "
+            f"≈{figures['session_bytes'] / 1e6:,.0f} MB per session beyond it"
+        )
+        if not warm_job.done():
+            st.caption("Warming caches for the default and most-used selections…")
+        elif warm_job.exception() is None:
+            st.caption(f"Caches warmed for {warm_job.result()} selection(s) of this dataset")
+        rerun_quantiles = latency_quantiles().get("rerun")
+        if rerun_quantiles:
+            st.caption(
+                f"Rerun latency p50 {rerun_quantiles[0.5] * 1000:,.0f} ms · "
+                f"p95 {rerun_quantiles[0.95] * 1000:,.0f} ms (this server process)"
+            )
+
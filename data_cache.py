@@ -0,0 +1,236 @@
+import hashlib
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from schema import compact
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+try:
+    import openpyxl
+    HAS_OPENPYXL = True
+except ImportError:
+    HAS_OPENPYXL = False
+
+# On-disk columnar cache for parsed sales data
+#
+# Parsed files are stored as Parquet under CACHE_DIR, named after the content
+# hash of the source bytes. A changed file hashes differently, so stale entries
+# are never read; bump CACHE_VERSION whenever the parsed schema changes.
+# Workbooks are keyed by content and sheet and land in the same cache, with
+# the same dtypes, as CSV files.
+#
+# With SALES_MEMORY_MAP=1 a load also keeps an uncompressed Arrow IPC copy
+# next to the Parquet file and returns a frame mapped from it: fixed-width
+# columns then point into the file's pages, which the OS shares between every
+# process serving the same data instead of each holding its own copy.
+
+CACHE_DIR = Path(os.environ.get("SALES_CACHE_DIR", ".cache/sales"))
+CACHE_VERSION = "2"
+MEMORY_MAP = os.environ.get("SALES_MEMORY_MAP", "") not in ("", "0")
+CSV_ENCODING = "latin-1"
+
+DATE_COLUMNS = ["Order Date", "Ship Date"]
+DATE_FORMAT = "%m/%d/%Y"
+CATEGORY_COLUMNS = [
+    "Ship Mode", "Segment", "Country", "City", "State",
+    "Region", "Category", "Sub-Category",
+]
+EXCEL_EXTENSIONS = (".xlsx", ".xlsm")
+EXCEL_CHUNK_ROWS = 50_000
+
+_HASH_BLOCK = 1 << 20
+
+
+def _read_bytes(source):
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    return None
+
+
+def content_hash(source, variant=None):
+    """Hash a file path or uploaded file by content (and e.g. the sheet read)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(CACHE_VERSION.encode())
+    if variant is not None:
+        digest.update(f"\0{variant}\0".encode())
+    data = _read_bytes(source)
+    if data is not None:
+        digest.update(data)
+    else:
+        with open(source, "rb") as fh:
+            for block in iter(lambda: fh.read(_HASH_BLOCK), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_dates(series):
+    try:
+        return pd.to_datetime(series, format=DATE_FORMAT)
+    except (ValueError, TypeError):
+        return pd.to_datetime(series)
+
+
+def apply_types(df):
+    # Clean data
+    df.columns = df.columns.str.strip()
+    for col in DATE_COLUMNS:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = parse_dates(df[col])
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return compact(df)
+
+
+def parse_csv(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return apply_types(pd.read_csv(source, encoding=CSV_ENCODING))
+
+
+def is_excel(source):
+    name = getattr(source, "name", source)
+    return isinstance(name, (str, os.PathLike)) and str(name).lower().endswith(EXCEL_EXTENSIONS)
+
+
+def _open_workbook(source):
+    if not HAS_OPENPYXL:
+        raise ImportError("Reading Excel files requires openpyxl")
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return openpyxl.load_workbook(source, read_only=True, data_only=True)
+
+
+def excel_sheets(source):
+    workbook = _open_workbook(source)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def _typed_chunk(records, columns):
+    # Dates and numbers are converted per chunk so only one chunk of raw
+    # cell values is alive at a time
+    chunk = pd.DataFrame.from_records(records, columns=columns)
+    for col in columns:
+        if col in DATE_COLUMNS:
+            if not pd.api.types.is_datetime64_any_dtype(chunk[col]):
+                chunk[col] = parse_dates(chunk[col])
+        elif chunk[col].dtype == object:
+            numeric = pd.to_numeric(chunk[col], errors="coerce")
+            if numeric.notna().sum() == chunk[col].notna().sum():
+                chunk[col] = numeric
+    return chunk
+
+
+def parse_excel(source, sheet=None, chunk_rows=EXCEL_CHUNK_ROWS):
+    """Stream one sheet (the first by default) of a workbook in read-only mode."""
+    workbook = _open_workbook(source)
+    try:
+        worksheet = workbook[sheet] if sheet is not None else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return apply_types(pd.DataFrame())
+        columns = [str(name).strip() if name is not None else f"Unnamed: {i}"
+                   for i, name in enumerate(header)]
+
+        chunks = []
+        records = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            records.append(row[:len(columns)] + (None,) * (len(columns) - len(row)))
+            if len(records) == chunk_rows:
+                chunks.append(_typed_chunk(records, columns))
+                records = []
+        if records or not chunks:
+            chunks.append(_typed_chunk(records, columns))
+    finally:
+        workbook.close()
+    return apply_types(pd.concat(chunks, ignore_index=True))
+
+
+def cache_path(key, cache_dir=None):
+    return Path(cache_dir or CACHE_DIR) / f"{key}.parquet"
+
+
+def write_cache(df, path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def read_cache(path):
+    return pd.read_parquet(path, memory_map=True)
+
+
+def write_mapped(df, path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    df.to_feather(tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+
+def read_mapped(path):
+    # The table's buffers reference the mapping, so it stays open as long as
+    # the frame built on them is alive
+    table = pyarrow.ipc.open_file(pyarrow.memory_map(str(path), "r")).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def load_cached(source, cache_dir=None, parser=parse_csv, variant=None, memory_map=None):
+    """Return (df, key) for a file path or upload, parsing it only on a cache miss."""
+    key = content_hash(source, variant)
+    if not HAS_PYARROW:
+        return parser(source), key
+    memory_map = MEMORY_MAP if memory_map is None else memory_map
+
+    mapped_path = cache_path(key, cache_dir).with_suffix(".arrow")
+    if memory_map and mapped_path.exists():
+        try:
+            return read_mapped(mapped_path), key
+        except Exception:
+            mapped_path.unlink(missing_ok=True)
+
+    df = None
+    path = cache_path(key, cache_dir)
+    if path.exists():
+        try:
+            df = read_cache(path)
+        except Exception:
+            path.unlink(missing_ok=True)
+    if df is None:
+        df = parser(source)
+        try:
+            write_cache(df, path)
+        except OSError:
+            pass
+
+    if memory_map:
+        try:
+            write_mapped(df, mapped_path)
+            return read_mapped(mapped_path), key
+        except OSError:
+            pass
+    return df, key
+
+
+def load_excel_cached(source, sheet=None, cache_dir=None):
+    return load_cached(
+        source,
+        cache_dir,
+        parser=lambda src: parse_excel(src, sheet),
+        variant=f"sheet:{sheet or ''}",
+    )
@@ -0,0 +1,280 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+from cube import CUBE_DIMENSIONS, filter_cube
+from filter_engine import code_values
+from timeseries import percent_change
+
+# Distinct counts of orders, customers and products
+#
+# A sales row is an order line, so counting rows counts line items. Orders,
+# customers and products are counted by their IDs instead, integer-coded once
+# per dataset: the exact count of a selection marks each selected row's code
+# in a boolean array as long as the number of distinct IDs.
+#
+# On data too large to scan on every interaction, SketchCube keeps a
+# HyperLogLog sketch of each ID per month x Region x Category x Segment cell:
+# 2^HLL_PRECISION one-byte registers, each the highest rank (leading zeros
+# plus one) among the hashed IDs that land in it. Sketches merge by taking the
+# register-wise maximum, so any union of cells (a cube filter and the whole
+# months of the date range) is counted without touching rows; only the rows
+# of a partial month at either end of the range are hashed into the merge.
+# IDs are hashed by value, so sketches of different chunks or files merge as
+# well. The relative standard error is HLL_ERROR, 1.04 / sqrt(2^HLL_PRECISION),
+# so 95% of estimates fall within twice that.
+#
+# Files streamed in chunks fold their IDs into DaySketches, one sketch per ID
+# and day: bounded by the calendar rather than the rows, and enough to count
+# any date window, such as the two halves a KPI delta compares.
+
+DISTINCT_IDS = {"orders": "Order ID", "customers": "Customer ID", "products": "Product ID"}
+DISTINCT_GROUPS = ["Region", "Category", "Month"]
+HLL_PRECISION = 11  # 2,048 registers per sketch
+HLL_ERROR = 1.04 / np.sqrt(1 << HLL_PRECISION)  # ~2.3%
+SKETCH_ROWS = 5_000_000
+COUNT_BLOCK = 1 << 26  # bytes of seen-ID marks per block of groups in count_by
+ONE_DAY = pd.Timedelta(days=1)
+
+
+def hash_ids(values):
+    """64-bit hashes of ID values, the same for a value in any dataset or chunk."""
+    return pd.util.hash_array(pd.Series(values, dtype=object).astype(str).to_numpy(object), categorize=False)
+
+
+def _bit_length(values):
+    # Bit length of uint64 values; frexp is exact on each 32-bit half
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+def hll_positions(hashes, precision=HLL_PRECISION):
+    """Register index (the top bits) and rank (leading zeros of the rest, plus one) of hashes."""
+    width = 64 - precision
+    index = (hashes >> np.uint64(width)).astype(np.int64)
+    rest = hashes & np.uint64((1 << width) - 1)
+    return index, (width + 1 - _bit_length(rest)).astype(np.uint8)
+
+
+def hll_registers(index, rank, cells=None, n_cells=1, precision=HLL_PRECISION):
+    """(n_cells, 2^precision) registers of the hashes at index/rank, split by cell."""
+    m = 1 << precision
+    registers = np.zeros(n_cells * m, dtype=np.uint8)
+    np.maximum.at(registers, index if cells is None else cells * m + index, rank)
+    return registers.reshape(n_cells, m)
+
+
+def hll_count(registers):
+    """Estimated distinct count of each row of a register array."""
+    registers = np.atleast_2d(registers)
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.exp2(-registers.astype(np.float64)).sum(axis=1)
+    # Linear counting while registers are still empty
+    zeros = np.count_nonzero(registers == 0, axis=1)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+def group_labels(df, rows, by):
+    """The by value ("Month" being the order month) of each selected row, as strings."""
+    if by == "Month":
+        return df["Order Date"].iloc[rows].dt.to_period("M").astype(str).to_numpy()
+    return df[by].iloc[rows].astype(str).to_numpy()
+
+
+def order_kpis(kpis, counts):
+    """KPIs with Total Orders and Avg Order Value per distinct order, and customer and
+    product counts, from distinct counts such as analytics.distinct_counts returns;
+    distinct_estimated marks sketch estimates."""
+    if "orders" not in counts:
+        return kpis
+    kpis = dict(kpis, line_items=kpis.get("line_items", kpis["total_orders"]))
+    kpis["distinct_estimated"] = counts["estimated"]
+    kpis["total_orders"] = counts["orders"]
+    kpis["avg_order_value"] = kpis["total_sales"] / counts["orders"] if counts["orders"] > 0 else 0
+    if "customers" in counts:
+        kpis["unique_customers"] = counts["customers"]
+        kpis["sales_per_customer"] = kpis["total_sales"] / counts["customers"] if counts["customers"] > 0 else 0
+        kpis["orders_per_customer"] = counts["orders"] / counts["customers"] if counts["customers"] > 0 else 0
+    if "products" in counts:
+        kpis["unique_products"] = counts["products"]
+    return kpis
+
+
+def count_deltas(current, previous):
+    """Percent change of distinct orders and customers from the previous window's
+    counts to the current one's; None when the previous window holds none."""
+    return {
+        f"{name}_delta": percent_change(current[name], previous[name]) if previous.get(name, 0) > 0 else None
+        for name in ("orders", "customers") if name in current
+    }
+
+
+class DistinctIndex:
+    """Integer-coded order, customer and product IDs of a dataset."""
+
+    def __init__(self, df, columns=DISTINCT_IDS):
+        self.columns = columns
+        self.codes = {}
+        self.ids = {}
+        for name, column in columns.items():
+            if column not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[column], sort=False)
+            self.codes[name] = codes.astype(np.int32)
+            self.ids[name] = uniques
+
+    def appended(self, new_rows):
+        """An index of these rows followed by new_rows; IDs seen before keep their codes."""
+        index = copy.copy(self)
+        index.codes, index.ids = {}, {}
+        for name, codes in self.codes.items():
+            new_codes, extra = code_values(self.ids[name], new_rows[self.columns[name]])
+            index.codes[name] = np.concatenate([codes, new_codes])
+            index.ids[name] = pd.Index(self.ids[name]).append(pd.Index(extra))
+        return index
+
+    def count(self, rows=None):
+        """Exact {name: distinct IDs} over the rows (all rows when None)."""
+        counts = {}
+        for name, codes in self.codes.items():
+            # Missing IDs (-1) mark the spare last slot
+            seen = np.zeros(len(self.ids[name]) + 1, dtype=bool)
+            seen[codes if rows is None else codes[rows]] = True
+            counts[name] = int(np.count_nonzero(seen[:-1]))
+        return counts
+
+    def count_by(self, rows, groups, n_groups):
+        """Exact {name: distinct IDs per group}, groups being each row's group code."""
+        counts = {}
+        for name, codes in self.codes.items():
+            # As in count, one row of marks per group, for a block of groups at a time
+            n_ids = len(self.ids[name])
+            selected = codes[rows]
+            block = max(1, COUNT_BLOCK // (n_ids + 1))
+            counts[name] = np.zeros(n_groups, dtype=np.int64)
+            for start in range(0, n_groups, block):
+                stop = min(start + block, n_groups)
+                in_block = (groups >= start) & (groups < stop) if n_groups > block else slice(None)
+                seen = np.zeros((stop - start, n_ids + 1), dtype=bool)
+                seen[groups[in_block] - start, selected[in_block]] = True
+                counts[name][start:stop] = np.count_nonzero(seen[:, :-1], axis=1)
+        return counts
+
+
+class SketchCube:
+    """HyperLogLog registers of every ID per month x cube-dimension cell."""
+
+    def __init__(self, df, index, precision=HLL_PRECISION):
+        self.df = df
+        self.precision = precision
+        keys = [df["Order Date"].dt.to_period("M")] + [df[c] for c in CUBE_DIMENSIONS if c in df.columns]
+        grouped = df.groupby(keys, observed=True, sort=True, dropna=False)
+        cells = grouped.ngroup().to_numpy()
+        self.keys = grouped.size().index.to_frame(index=False)
+        self.keys["Order Date"] = self.keys["Order Date"].dt.to_timestamp()
+        self.keys["Month"] = self.keys["Order Date"].dt.strftime("%Y-%m")
+
+        self.codes = index.codes
+        self.positions = {}
+        self.registers = {}
+        for name, codes in index.codes.items():
+            slot, rank = hll_positions(hash_ids(index.ids[name]), precision)
+            self.positions[name] = slot, rank
+            present = codes >= 0
+            self.registers[name] = hll_registers(
+                slot[codes[present]], rank[codes[present]], cells[present], len(self.keys), precision)
+
+    def _split(self, date_range):
+        # Boolean mask of the cells in whole months of the range, and the
+        # (start, end) day ranges of the partial months at either end
+        if date_range is None:
+            return np.ones(len(self.keys), dtype=bool), []
+        start, end = pd.Timestamp(date_range[0]).normalize(), pd.Timestamp(date_range[1]).normalize()
+        first = start if start.is_month_start else start + pd.offsets.MonthBegin()
+        stop = end + ONE_DAY if (end + ONE_DAY).is_month_start else end.to_period("M").start_time
+        if first >= stop:
+            return np.zeros(len(self.keys), dtype=bool), [(start, end)] if start <= end else []
+        months = self.keys["Order Date"]
+        whole = ((months >= first) & (months < stop)).to_numpy()
+        partial = [(a, b) for a, b in [(start, first - ONE_DAY), (stop, end)] if a <= b]
+        return whole, partial
+
+    def count(self, filters, partial_rows, by=None):
+        """Estimated distinct counts of a cube-answerable filter dict: {name: count},
+        or (labels, {name: counts per label}) per value of by.
+
+        partial_rows(date_range) returns the selected row ids of a day range.
+        """
+        whole, partial = self._split(filters.get("date_range"))
+        cells = filter_cube(
+            self.keys[whole], None,
+            filters.get("regions"), filters.get("categories"), filters.get("segments"),
+        ).index.to_numpy()
+        rows = np.concatenate([partial_rows(r) for r in partial]) if partial else np.empty(0, dtype=np.int64)
+
+        if by is None:
+            groups, labels = np.zeros(len(cells) + len(rows), dtype=np.int64), [None]
+        else:
+            groups, labels = pd.factorize(np.concatenate([
+                self.keys[by].iloc[cells].astype(str).to_numpy(), group_labels(self.df, rows, by),
+            ]), sort=True)
+        cell_groups, row_groups = groups[:len(cells)], groups[len(cells):]
+        # Cells in group order, so each group's sketches are one slice to merge
+        order = np.argsort(cell_groups, kind="stable")
+        cells, cell_groups = cells[order], cell_groups[order]
+        filled, starts = np.unique(cell_groups, return_index=True)
+        spans = list(zip(filled, starts, np.append(starts[1:], len(cells))))
+
+        m = 1 << self.precision
+        counts = {}
+        for name, registers in self.registers.items():
+            merged = np.zeros((len(labels), m), dtype=np.uint8)
+            selected = registers[cells]
+            for group, start, stop in spans:
+                merged[group] = selected[start:stop].max(axis=0)
+            codes = self.codes[name][rows]
+            present = codes >= 0
+            slot, rank = self.positions[name]
+            np.maximum.at(merged.reshape(-1), row_groups[present] * m + slot[codes[present]],
+                          rank[codes[present]])
+            estimate = np.round(hll_count(merged)).astype(np.int64)
+            counts[name] = int(estimate[0]) if by is None else estimate
+        return counts if by is None else (list(labels), counts)
+
+
+class DaySketches:
+    """HyperLogLog registers of every ID per day, folded in chunk by chunk."""
+
+    def __init__(self, columns=DISTINCT_IDS, precision=HLL_PRECISION):
+        self.columns = columns
+        self.precision = precision
+        self.registers = {}
+
+    def add(self, chunk):
+        days, uniques = pd.factorize(chunk["Order Date"].dt.normalize())
+        for name, column in self.columns.items():
+            if column not in chunk.columns:
+                continue
+            present = chunk[column].notna().to_numpy()
+            slot, rank = hll_positions(hash_ids(chunk[column].to_numpy()[present]), self.precision)
+            registers = hll_registers(slot, rank, days[present], len(uniques), self.precision)
+            sketches = self.registers.setdefault(name, {})
+            for day, row in zip(uniques, registers):
+                sketches[day] = np.maximum(sketches[day], row) if day in sketches else row
+
+    def count(self, date_range=None):
+        """Estimated {name: distinct IDs} over the days of date_range (all days when None)."""
+        if date_range is not None:
+            start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1])
+        counts = {}
+        for name, sketches in self.registers.items():
+            merged = np.zeros(1 << self.precision, dtype=np.uint8)
+            for day, registers in sketches.items():
+                if date_range is None or start <= day <= end:
+                    np.maximum(merged, registers, out=merged)
+            counts[name] = int(np.round(hll_count(merged)[0]))
+        return counts
@@ -0,0 +1,77 @@
+import gzip
+import io
+import tempfile
+
+import pandas as pd
+
+# Export writers
+#
+# Exports are written in row chunks into a spooled temporary file (kept in
+# memory while small, spilled to disk when large) instead of building one
+# big string, so only the encoded, optionally compressed bytes are held in
+# full once the file is read back for download.
+
+EXPORT_CHUNK_ROWS = 100_000
+SPOOL_MAX_BYTES = 32 * 1024 * 1024
+
+EXPORT_FORMATS = {
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def _chunks(df, rows, chunk_rows):
+    for start in range(0, len(rows), chunk_rows):
+        yield df.iloc[rows[start:start + chunk_rows]]
+
+
+def _spooled():
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+
+
+def _drain(fh):
+    fh.seek(0)
+    with fh:
+        return fh.read()
+
+
+def write_csv(df, rows, fh, compress=False, chunk_rows=EXPORT_CHUNK_ROWS):
+    raw = gzip.GzipFile(fileobj=fh, mode="wb") if compress else fh
+    text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    for i, chunk in enumerate(_chunks(df, rows, chunk_rows)):
+        chunk.to_csv(text, index=False, header=i == 0)
+    text.flush()
+    text.detach()
+    if compress:
+        raw.close()
+
+
+def write_parquet(df, rows, fh, chunk_rows=EXPORT_CHUNK_ROWS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+    with pq.ParquetWriter(fh, schema) as writer:
+        for chunk in _chunks(df, rows, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def export_rows(df, rows, fmt):
+    """Bytes of df.iloc[rows] encoded in one of EXPORT_FORMATS."""
+    fh = _spooled()
+    if fmt == "Parquet":
+        write_parquet(df, rows, fh)
+    else:
+        write_csv(df, rows, fh, compress=fmt == "CSV (gzip)")
+    return _drain(fh)
+
+
+def export_workbook(sheets):
+    """Bytes of an .xlsx workbook with one sheet per named frame."""
+    fh = _spooled()
+    with pd.ExcelWriter(fh, engine="openpyxl") as writer:
+        for name, frame in sheets.items():
+            frame.to_excel(writer, sheet_name=name[:31], index=False)
+    return _drain(fh)
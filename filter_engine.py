@@ -0,0 +1,272 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+# Indexed filter engine
+#
+# Built once per dataset. Order dates and Sales are kept sorted (with the row
+# permutation that sorts them) so range filters are two binary searches, and
+# every filter dimension is integer-coded with one packed row bitmap per value.
+# A selection is the AND of the range bitmaps and the OR-ed value bitmaps of
+# each dimension; only the surviving row ids are materialized.
+#
+# Facets are the sidebar's cross-filtered counts: for every value of a
+# dimension, the rows and Sales it would select given the date range, the
+# Sales range and the selections of all the other dimensions. With only a date
+# range in play they come from per-day running totals of each value, a
+# subtraction per value at any scale; otherwise from one pass over the rows
+# left by intersecting the other filters' bitmaps.
+#
+# Rows appended to a dataset (see incremental.py) extend a built engine: they
+# are binary-searched into the sorted dates and Sales, coded against the known
+# values and added to the bitmaps and running totals, so the existing rows are
+# never re-sorted or re-coded.
+
+# Filter dict key (see analytics.py) -> column it filters on
+DIMENSION_FILTERS = {
+    "regions": "Region",
+    "categories": "Category",
+    "segments": "Segment",
+    "ship_modes": "Ship Mode",
+    "states": "State",
+    "sub_categories": "Sub-Category",
+}
+FILTER_DIMENSIONS = list(DIMENSION_FILTERS.values())
+ONE_DAY = np.timedelta64(1, "D")
+FIRST_BLOCK = 1024
+
+
+class FilterEngine:
+    def __init__(self, df, dimensions=FILTER_DIMENSIONS):
+        self.n_rows = len(df)
+
+        dates = df["Order Date"].to_numpy("datetime64[ns]")
+        self.date_order = np.argsort(dates, kind="stable")
+        self.sorted_dates = dates[self.date_order]
+
+        self.sales = df["Sales"].to_numpy(np.float64)
+        self.sales_order = np.argsort(self.sales, kind="stable")
+        self.sorted_sales = self.sales[self.sales_order]
+
+        self.days, self.row_days = np.unique(dates.astype("datetime64[D]"), return_inverse=True)
+        self.day_totals = {}
+
+        self.codes = {}
+        self.values = {}
+        self.bitmaps = {}
+        for dim in dimensions:
+            if dim not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[dim], sort=False)
+            self.codes[dim] = codes.astype(np.int32)
+            self.values[dim] = list(uniques)
+            self.bitmaps[dim] = {
+                value: np.packbits(codes == i) for i, value in enumerate(uniques)
+            }
+
+    def appended(self, new_rows):
+        """An engine over these rows followed by new_rows, a frame of the same columns."""
+        engine = copy.copy(self)
+        n_old = self.n_rows
+        engine.n_rows = n_old + len(new_rows)
+
+        dates = new_rows["Order Date"].to_numpy("datetime64[ns]")
+        engine.date_order, engine.sorted_dates = _insert_sorted(self.date_order, self.sorted_dates, dates, n_old)
+        sales = new_rows["Sales"].to_numpy(np.float64)
+        engine.sales = np.concatenate([self.sales, sales])
+        engine.sales_order, engine.sorted_sales = _insert_sorted(self.sales_order, self.sorted_sales, sales, n_old)
+
+        new_days = dates.astype("datetime64[D]")
+        engine.days = np.union1d(self.days, new_days)
+        old_row_days = self.row_days
+        if len(engine.days) > len(self.days):
+            old_row_days = np.searchsorted(engine.days, self.days)[old_row_days]
+        new_row_days = np.searchsorted(engine.days, new_days)
+        engine.row_days = np.concatenate([old_row_days, new_row_days])
+
+        engine.codes, engine.values, engine.bitmaps, engine.day_totals = {}, {}, {}, {}
+        no_rows = np.zeros((n_old + 7) // 8, dtype=np.uint8)
+        for dim, codes in self.codes.items():
+            new_codes, extra = code_values(self.values[dim], new_rows[dim])
+            values = self.values[dim] + list(extra)
+            engine.codes[dim] = np.concatenate([codes, new_codes])
+            engine.values[dim] = values
+            engine.bitmaps[dim] = {
+                value: _extend_bitmap(self.bitmaps[dim].get(value, no_rows), n_old, new_codes == i)
+                for i, value in enumerate(values)
+            }
+            if dim in self.day_totals:
+                # Old running totals read at each new day, plus the new rows' own
+                counts, sales_totals = self.day_totals[dim]
+                at = np.concatenate([[0], np.searchsorted(self.days, engine.days, side="right")])
+                new_counts, new_sales = _running_totals(new_row_days, new_codes, sales, len(engine.days), len(values))
+                new_counts[:, :counts.shape[1]] += counts[at]
+                new_sales[:, :sales_totals.shape[1]] += sales_totals[at]
+                engine.day_totals[dim] = (new_counts, new_sales)
+        return engine
+
+    # Bitmap helpers
+
+    def all_rows(self):
+        return np.packbits(np.ones(self.n_rows, dtype=bool))
+
+    def rows_to_bitmap(self, rows):
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[rows] = True
+        return np.packbits(mask)
+
+    def bitmap_to_rows(self, bitmap):
+        return np.flatnonzero(np.unpackbits(bitmap, count=self.n_rows))
+
+    # Per-filter bitmaps
+
+    def date_rows(self, start_date, end_date):
+        lo = np.searchsorted(self.sorted_dates, np.datetime64(start_date, "ns"), side="left")
+        hi = np.searchsorted(self.sorted_dates, np.datetime64(end_date, "ns") + ONE_DAY, side="left")
+        return self.date_order[lo:hi]
+
+    def date_bitmap(self, date_range):
+        if date_range is None:
+            return self.all_rows()
+        return self.rows_to_bitmap(self.date_rows(*date_range))
+
+    def sales_bitmap(self, sales_range):
+        lo = np.searchsorted(self.sorted_sales, sales_range[0], side="left")
+        hi = np.searchsorted(self.sorted_sales, sales_range[1], side="right")
+        return self.rows_to_bitmap(self.sales_order[lo:hi])
+
+    def dimension_bitmap(self, dim, values):
+        bitmap = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+        for value in values:
+            value_bitmap = self.bitmaps[dim].get(value)
+            if value_bitmap is not None:
+                np.bitwise_or(bitmap, value_bitmap, out=bitmap)
+        return bitmap
+
+    # Queries
+
+    def values_present(self, dim, bitmap):
+        """Values of a dimension that occur in the rows of a bitmap."""
+        return [value for value in self.values[dim]
+                if np.bitwise_and(self.bitmaps[dim][value], bitmap).any()]
+
+    def sales_bounds(self, bitmap):
+        """(min, max) Sales of the rows in a bitmap, found by walking the Sales order
+        from each end until a selected row turns up."""
+        selected = np.unpackbits(bitmap, count=self.n_rows).view(bool)
+        low = _first_selected(selected, self.sales_order)
+        high = _first_selected(selected, self.sales_order[::-1])
+        return float(self.sales[low]), float(self.sales[high])
+
+    # Facets
+
+    def _day_totals(self, dim):
+        # Running (rows, Sales) per day and value, with a leading zero day
+        if dim not in self.day_totals:
+            self.day_totals[dim] = _running_totals(
+                self.row_days, self.codes[dim], self.sales, len(self.days), len(self.values[dim])
+            )
+        return self.day_totals[dim]
+
+    def facets(self, date_range, selections, sales_range=None):
+        """{dim: (rows, Sales)} per value of each dimension, in self.values order, over
+        the date range, the Sales range and the selections of the other dimensions.
+
+        selections maps dimensions to selected values; None (or a missing
+        dimension) selects every value.
+        """
+        filtered = {dim: values for dim, values in selections.items() if values is not None}
+        base = None
+        others = {}
+        result = {}
+        for dim in self.codes:
+            other = tuple(d for d in filtered if d != dim)
+            if not other and sales_range is None:
+                counts, sales = self._day_totals(dim)
+                if date_range is None:
+                    lo, hi = 0, len(self.days)
+                else:
+                    lo = np.searchsorted(self.days, np.datetime64(date_range[0], "D"), side="left")
+                    hi = np.searchsorted(self.days, np.datetime64(date_range[1], "D"), side="right")
+                result[dim] = (counts[hi] - counts[lo], sales[hi] - sales[lo])
+                continue
+            if other not in others:
+                if base is None:
+                    base = self.date_bitmap(date_range)
+                    if sales_range is not None:
+                        base = np.bitwise_and(base, self.sales_bitmap(sales_range))
+                bitmap = base.copy()
+                for d in other:
+                    np.bitwise_and(bitmap, self.dimension_bitmap(d, filtered[d]), out=bitmap)
+                others[other] = self.bitmap_to_rows(bitmap)
+            rows = others[other]
+            codes = self.codes[dim][rows]
+            present = codes >= 0
+            n_values = len(self.values[dim])
+            result[dim] = (
+                np.bincount(codes[present], minlength=n_values),
+                np.bincount(codes[present], self.sales[rows][present], minlength=n_values),
+            )
+        return result
+
+    def select(self, base_bitmap, filters=None, sales_range=None):
+        """Row ids matching a base (date) bitmap, dimension filters and a Sales range."""
+        bitmap = base_bitmap.copy()
+        for dim, values in (filters or {}).items():
+            np.bitwise_and(bitmap, self.dimension_bitmap(dim, values), out=bitmap)
+        if sales_range is not None:
+            np.bitwise_and(bitmap, self.sales_bitmap(sales_range), out=bitmap)
+        return self.bitmap_to_rows(bitmap)
+
+
+def code_values(uniques, values):
+    """Codes of values (a Series) against uniques as pd.factorize returns them, and the
+    values not among them, which take the next codes; missing values are -1."""
+    codes = pd.Index(uniques).get_indexer(values)
+    unknown = (codes < 0) & values.notna().to_numpy()
+    extra_codes, extra = pd.factorize(values[unknown], sort=False)
+    codes[unknown] = len(uniques) + extra_codes
+    return codes.astype(np.int32), extra
+
+
+def _running_totals(row_days, codes, sales, n_days, n_values):
+    # Running (rows, Sales) per day and value, with a leading zero day
+    present = codes >= 0
+    cells = row_days[present] * n_values + codes[present]
+    size = n_days * n_values
+    counts = np.bincount(cells, minlength=size).reshape(n_days, n_values)
+    sales = np.bincount(cells, sales[present], minlength=size).reshape(n_days, n_values)
+    zero = np.zeros((1, n_values))
+    return (
+        np.vstack([zero, np.cumsum(counts, axis=0)]).astype(np.int64),
+        np.vstack([zero, np.cumsum(sales, axis=0)]),
+    )
+
+
+def _insert_sorted(order, sorted_values, values, offset):
+    # Row ids offset.. of values inserted into a stable sort order, after equal keys
+    new_order = np.argsort(values, kind="stable")
+    at = np.searchsorted(sorted_values, values[new_order], side="right")
+    return np.insert(order, at, new_order + offset), np.insert(sorted_values, at, values[new_order])
+
+
+def _extend_bitmap(bitmap, n_rows, mask):
+    # A packed bitmap of n_rows rows followed by the rows of a boolean mask;
+    # only the last, partly filled byte is unpacked
+    full = n_rows // 8
+    tail = np.unpackbits(bitmap[full:], count=n_rows - full * 8)
+    return np.concatenate([bitmap[:full], np.packbits(np.concatenate([tail, mask]))])
+
+
+def _first_selected(selected, order):
+    # First id in order whose row is selected, checking blocks that double in size
+    start, size = 0, FIRST_BLOCK
+    while start < len(order):
+        block = order[start:start + size]
+        hits = np.flatnonzero(selected[block])
+        if len(hits):
+            return block[hits[0]]
+        start += size
+        size *= 2
+    raise ValueError("empty selection")
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+# Region -> State -> City rollup
+#
+# One groupby over the selected rows sums Sales, Profit and order counts per
+# city; states and regions are re-summed from the city cells, not from rows.
+# Every node's children are stored as a ready table keyed by the node's path,
+# so expanding a region or a state is a dictionary lookup whatever the size
+# of the data. With per-row weights (a sample) the totals are estimates.
+
+GEO_LEVELS = ["Region", "State", "City"]
+GEO_MEASURES = ["Sales", "Profit", "Orders"]
+
+US_STATE_CODES = {
+    "Alabama": "AL", "Alaska": "AK", "Arizona": "AZ", "Arkansas": "AR", "California": "CA",
+    "Colorado": "CO", "Connecticut": "CT", "Delaware": "DE", "District of Columbia": "DC",
+    "Florida": "FL", "Georgia": "GA", "Hawaii": "HI", "Idaho": "ID", "Illinois": "IL",
+    "Indiana": "IN", "Iowa": "IA", "Kansas": "KS", "Kentucky": "KY", "Louisiana": "LA",
+    "Maine": "ME", "Maryland": "MD", "Massachusetts": "MA", "Michigan": "MI", "Minnesota": "MN",
+    "Mississippi": "MS", "Missouri": "MO", "Montana": "MT", "Nebraska": "NE", "Nevada": "NV",
+    "New Hampshire": "NH", "New Jersey": "NJ", "New Mexico": "NM", "New York": "NY",
+    "North Carolina": "NC", "North Dakota": "ND", "Ohio": "OH", "Oklahoma": "OK", "Oregon": "OR",
+    "Pennsylvania": "PA", "Rhode Island": "RI", "South Carolina": "SC", "South Dakota": "SD",
+    "Tennessee": "TN", "Texas": "TX", "Utah": "UT", "Vermont": "VT", "Virginia": "VA",
+    "Washington": "WA", "West Virginia": "WV", "Wisconsin": "WI", "Wyoming": "WY",
+}
+
+
+def has_geography(df):
+    return all(col in df.columns for col in GEO_LEVELS)
+
+
+def _with_margin(table):
+    table["Profit Margin"] = (table["Profit"] / table["Sales"] * 100).where(table["Sales"] != 0, 0).round(2)
+    return table
+
+
+def _node_table(totals, level):
+    table = _with_margin(totals.reset_index()[[level] + GEO_MEASURES])
+    return table.sort_values("Sales", ascending=False, ignore_index=True)
+
+
+class GeoRollup:
+    def __init__(self, df, weights=None):
+        cells = pd.DataFrame({level: df[level] for level in GEO_LEVELS})
+        cells["Sales"] = df["Sales"].to_numpy(np.float64)
+        cells["Profit"] = df["Profit"].to_numpy(np.float64)
+        cells["Orders"] = np.ones(len(df), dtype=np.int64)
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64)
+            for col in GEO_MEASURES:
+                cells[col] = cells[col].to_numpy() * weights
+        cities = cells.groupby(GEO_LEVELS, observed=True)[GEO_MEASURES].sum()
+        states = cities.groupby(level=[0, 1], observed=True).sum()
+        regions = cities.groupby(level=0, observed=True).sum()
+
+        self.nodes = {(): _node_table(regions, "Region")}
+        for region, children in states.groupby(level=0, observed=True):
+            self.nodes[(region,)] = _node_table(children, "State")
+        for (region, state), children in cities.groupby(level=[0, 1], observed=True):
+            self.nodes[(region, state)] = _node_table(children, "City")
+
+        self.states = _with_margin(states.reset_index())
+        self.states["Code"] = self.states["State"].astype(str).map(US_STATE_CODES)
+
+    def children(self, *path):
+        """Table of the children of the node at path: () for regions, (region,)
+        for its states, (region, state) for its cities."""
+        return self.nodes.get(tuple(path))
+
+    def state_map(self, region=None):
+        """Per-state totals with postal codes, for a choropleth of all or one region's states."""
+        if region is None:
+            return self.states
+        return self.states[self.states["Region"] == region]
@@ -0,0 +1,208 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from analytics import Dataset
+from data_cache import (
+    CACHE_DIR, CSV_ENCODING, HAS_PYARROW, apply_types,
+    load_cached, read_cache, write_cache,
+)
+from instrumentation import register_shared
+
+# Incremental ingestion of an append-only CSV
+#
+# The file is read up to its last complete line and the byte offset reached is
+# kept. A refresh parses only the bytes appended since then and merges them
+# into the frame and the structures already built on it (cube, filter engine,
+# distinct index, sort orders; see Dataset.appended), so a file that grows
+# every few minutes is never reparsed or re-indexed from scratch. The frame
+# itself is concatenated, which copies its columns once per refresh. Fingerprints of the first block and of the block just
+# before the offset detect rewrites and truncations, which trigger a full
+# reload instead.
+#
+# A checkpoint (frame as Parquet plus offset and fingerprints) is written at
+# most every CHECKPOINT_SECONDS, so a restarted server resumes from it and
+# parses only the tail that arrived since.
+#
+# Each version of the dataset is built with the source's workers and
+# registered as shared memory under one key per file, replacing the last.
+
+FINGERPRINT_BYTES = 64 * 1024
+CHECKPOINT_SECONDS = 300
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def complete_lines(data):
+    """Bytes up to and including the last newline; a partial last line waits."""
+    end = data.rfind(b"\n")
+    return data[:end + 1] if end >= 0 else b""
+
+
+def append_frames(df, new_rows):
+    # Align category sets first so the concat keeps categorical columns. The
+    # shallow copy keeps the frame other sessions may still be reading intact
+    df = df.copy(deep=False)
+    for col in df.columns:
+        if not isinstance(df[col].dtype, pd.CategoricalDtype) or col not in new_rows.columns:
+            continue
+        if not isinstance(new_rows[col].dtype, pd.CategoricalDtype):
+            new_rows[col] = new_rows[col].astype("category")
+        missing = new_rows[col].cat.categories.difference(df[col].cat.categories)
+        if len(missing):
+            df[col] = df[col].cat.add_categories(missing)
+        new_rows[col] = new_rows[col].cat.set_categories(df[col].cat.categories)
+    return pd.concat([df, new_rows], ignore_index=True)
+
+
+class IncrementalSource:
+    def __init__(self, path, cache_dir=None, workers=None):
+        self.path = Path(path)
+        self.cache_dir = Path(cache_dir or CACHE_DIR)
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.dataset = None
+        self.offset = 0
+        self.seen_size = 0
+        self.header = b""
+        self.head_fingerprint = None
+        self.tail_fingerprint = None
+        self.base_key = None
+        self.appended_rows = 0
+        self.last_checkpoint = 0.0
+
+    # Fingerprints
+
+    def _fingerprints(self, fh, offset):
+        fh.seek(0)
+        head = _digest(fh.read(min(offset, FINGERPRINT_BYTES)))
+        fh.seek(max(0, offset - FINGERPRINT_BYTES))
+        tail = _digest(fh.read(min(offset, FINGERPRINT_BYTES)))
+        return head, tail
+
+    def _unchanged_prefix(self, fh, size):
+        if size < self.offset:
+            return False
+        return self._fingerprints(fh, self.offset) == (self.head_fingerprint, self.tail_fingerprint)
+
+    @property
+    def key(self):
+        return f"{self.base_key}+{self.offset}"
+
+    def _publish(self, dataset):
+        self.dataset = dataset
+        register_shared(f"live:{self.path.resolve()}", int(dataset.df.memory_usage(index=True, deep=True).sum()))
+
+    @property
+    def checkpoint_path(self):
+        return self.cache_dir / f"live_{_digest(str(self.path.resolve()).encode())}"
+
+    # Loading
+
+    def _full_load(self):
+        with open(self.path, "rb") as fh:
+            data = fh.read()
+            self.seen_size = len(data)
+            data = complete_lines(data)
+            self.offset = len(data)
+            self.head_fingerprint, self.tail_fingerprint = self._fingerprints(fh, self.offset)
+        self.header = data[:data.find(b"\n") + 1]
+        df, self.base_key = load_cached(io.BytesIO(data), cache_dir=self.cache_dir)
+        self._publish(Dataset(df, self.key, self.workers))
+        self.appended_rows = 0
+
+    def _resume(self):
+        # Pick up from a checkpoint if the file still starts with what it covered
+        state_path = self.checkpoint_path.with_suffix(".json")
+        if not HAS_PYARROW or not state_path.exists():
+            return False
+        try:
+            state = json.loads(state_path.read_text())
+            with open(self.path, "rb") as fh:
+                size = self.seen_size = os.fstat(fh.fileno()).st_size
+                if size < state["offset"] or self._fingerprints(fh, state["offset"]) != (
+                        state["head_fingerprint"], state["tail_fingerprint"]):
+                    return False
+            df = read_cache(self.checkpoint_path.with_suffix(".parquet"))
+        except (OSError, ValueError, KeyError):
+            return False
+        self.offset = state["offset"]
+        self.head_fingerprint = state["head_fingerprint"]
+        self.tail_fingerprint = state["tail_fingerprint"]
+        self.header = state["header"].encode("latin-1")
+        self.base_key = state["base_key"]
+        self._publish(Dataset(df, self.key, self.workers))
+        self.last_checkpoint = time.time()
+        return True
+
+    def checkpoint(self):
+        if not HAS_PYARROW or self.dataset is None:
+            return
+        state = {
+            "offset": self.offset,
+            "head_fingerprint": self.head_fingerprint,
+            "tail_fingerprint": self.tail_fingerprint,
+            "header": self.header.decode("latin-1"),
+            "base_key": self.base_key,
+        }
+        path = self.checkpoint_path
+        try:
+            write_cache(self.dataset.df, path.with_suffix(".parquet"))
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(state))
+            os.replace(tmp_path, path.with_suffix(".json"))
+        except OSError:
+            return
+        self.last_checkpoint = time.time()
+
+    def has_new_data(self):
+        try:
+            return os.stat(self.path).st_size != self.seen_size
+        except OSError:
+            return False
+
+    def refresh(self):
+        """Ingest whatever was appended since the last call; returns new row count."""
+        with self.lock:
+            if self.dataset is None:
+                if not self._resume():
+                    self._full_load()
+                    self.checkpoint()
+                    return len(self.dataset.df)
+
+            with open(self.path, "rb") as fh:
+                size = self.seen_size = os.fstat(fh.fileno()).st_size
+                if size == self.offset:
+                    return 0
+                if not self._unchanged_prefix(fh, size):
+                    self.dataset = None
+                    self._full_load()
+                    self.checkpoint()
+                    return len(self.dataset.df)
+                fh.seek(self.offset)
+                data = complete_lines(fh.read(size - self.offset))
+                if not data:
+                    return 0
+                offset = self.offset + len(data)
+                fingerprints = self._fingerprints(fh, offset)
+
+            new_rows = apply_types(pd.read_csv(io.BytesIO(self.header + data), encoding=CSV_ENCODING))
+            previous = self.dataset
+            df = append_frames(previous.df, new_rows)
+            self.offset = offset
+            self.head_fingerprint, self.tail_fingerprint = fingerprints
+            self.appended_rows += len(new_rows)
+
+            self._publish(previous.appended(df, self.key))
+
+            if time.time() - self.last_checkpoint >= CHECKPOINT_SECONDS:
+                self.checkpoint()
+            return len(new_rows)
@@ -0,0 +1,222 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# Rerun instrumentation
+#
+# A RerunProfile records named timing spans, each with the RSS change across
+# it, for one run of the dashboard script. Finished profiles are appended to
+# a JSON-lines log and kept in a process-wide window from which p50/p95
+# latencies are reported, optionally as a Prometheus text-format file.
+#
+# Every profile also marks its session as seen, so the number of sessions
+# active within SESSION_TTL can be reported next to the process RSS and the
+# bytes of the datasets shared by all sessions (register_shared, and
+# release_shared once one is dropped). What the process holds beyond its RSS
+# at import time and the shared data is averaged over the active sessions as
+# their per-session cost.
+#
+#   SALES_PERF_LOG        JSON-lines log path (unset to disable), e.g.
+#                         .cache/perf/reruns.jsonl
+#   SALES_PERF_LOG_BYTES  size at which the log is rotated to <path>.1
+#                         (default 50 MB), so at most twice that is kept
+#   SALES_PERF_PROM       Prometheus textfile path (unset to disable)
+
+PERF_LOG = os.environ.get("SALES_PERF_LOG")
+PERF_LOG_BYTES = int(os.environ.get("SALES_PERF_LOG_BYTES", 50 * 1024 * 1024))
+PROM_FILE = os.environ.get("SALES_PERF_PROM")
+WINDOW = 500
+SESSION_TTL = 300
+METRIC_PREFIX = "sales_dashboard"
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+_lock = threading.Lock()
+_log_lock = threading.Lock()
+_recent = deque(maxlen=WINDOW)
+_totals = {"count": 0, "sum": 0.0}
+_sessions = {}
+_shared = {}
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def touch_session(session_id):
+    with _lock:
+        _sessions[session_id] = time.time()
+
+
+def active_sessions(ttl=SESSION_TTL):
+    """Sessions that ran the script within the last ttl seconds."""
+    cutoff = time.time() - ttl
+    with _lock:
+        for session_id in [s for s, seen in _sessions.items() if seen < cutoff]:
+            del _sessions[session_id]
+        return len(_sessions)
+
+
+def register_shared(key, nbytes):
+    """Record a dataset held once per process, for the shared-memory figures."""
+    with _lock:
+        _shared[key] = nbytes
+
+
+def release_shared(key):
+    """Forget a shared dataset once the process no longer holds it."""
+    with _lock:
+        _shared.pop(key, None)
+
+
+def memory_figures():
+    """Active sessions, RSS and shared dataset bytes of this server process."""
+    sessions = active_sessions()
+    with _lock:
+        shared_bytes = sum(_shared.values())
+        shared_datasets = len(_shared)
+    rss_bytes = current_rss_mb() * 1024 * 1024
+    per_session = rss_bytes - _baseline_rss_mb * 1024 * 1024 - shared_bytes
+    return {
+        "active_sessions": sessions,
+        "rss_bytes": rss_bytes,
+        "shared_bytes": shared_bytes,
+        "shared_datasets": shared_datasets,
+        "session_bytes": max(per_session, 0) / sessions if sessions else 0.0,
+    }
+
+
+_baseline_rss_mb = current_rss_mb()
+
+
+class RerunProfile:
+    def __init__(self, session_id=None):
+        if session_id is not None:
+            touch_session(session_id)
+        self.session_id = session_id
+        self.spans = []
+        self.started = time.perf_counter()
+        self.start_rss = current_rss_mb()
+        self.total_seconds = None
+
+    @contextmanager
+    def span(self, name):
+        rss = current_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append({
+                "name": name,
+                "seconds": time.perf_counter() - start,
+                "rss_delta_mb": current_rss_mb() - rss,
+            })
+
+    def finish(self):
+        """Close the profile, log it and add it to the latency window."""
+        self.total_seconds = time.perf_counter() - self.started
+        record = {
+            "timestamp": datetime.now().isoformat(timespec="milliseconds"),
+            "session": self.session_id,
+            "total_seconds": self.total_seconds,
+            "rss_mb": current_rss_mb(),
+            "rss_delta_mb": current_rss_mb() - self.start_rss,
+            "spans": self.spans,
+        }
+        with _lock:
+            _recent.append(record)
+            _totals["count"] += 1
+            _totals["sum"] += self.total_seconds
+        if PERF_LOG:
+            _append_log(record)
+        if PROM_FILE:
+            write_prometheus(PROM_FILE)
+        return record
+
+
+def _append_log(record):
+    # Own lock, so sessions only wait on each other's log writes
+    path = Path(PERF_LOG)
+    line = json.dumps(record) + "\n"
+    with _log_lock:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.exists() and path.stat().st_size >= PERF_LOG_BYTES:
+                path.replace(path.with_name(path.name + ".1"))
+            with open(path, "a") as fh:
+                fh.write(line)
+        except OSError:
+            pass
+
+
+def latency_quantiles(quantiles=(0.5, 0.95)):
+    """Rerun and per-stage latency quantiles over the recent window."""
+    with _lock:
+        records = list(_recent)
+    if not records:
+        return {}
+    stages = {}
+    for record in records:
+        for span in record["spans"]:
+            stages.setdefault(span["name"], []).append(span["seconds"])
+    result = {"rerun": np.quantile([r["total_seconds"] for r in records], quantiles)}
+    for name, values in stages.items():
+        result[name] = np.quantile(values, quantiles)
+    return {name: dict(zip(quantiles, values.tolist())) for name, values in result.items()}
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def write_prometheus(path):
+    quantiles = latency_quantiles()
+    with _lock:
+        count, total = _totals["count"], _totals["sum"]
+    lines = [
+        f"# HELP {METRIC_PREFIX}_rerun_seconds Dashboard script rerun latency.",
+        f"# TYPE {METRIC_PREFIX}_rerun_seconds summary",
+    ]
+    for q, value in quantiles.get("rerun", {}).items():
+        lines.append(f'{METRIC_PREFIX}_rerun_seconds{{quantile="{q}"}} {value:.6f}')
+    lines.append(f"{METRIC_PREFIX}_rerun_seconds_sum {total:.6f}")
+    lines.append(f"{METRIC_PREFIX}_rerun_seconds_count {count}")
+    lines.append(f"# HELP {METRIC_PREFIX}_stage_seconds Latency of named rerun stages over the recent window.")
+    lines.append(f"# TYPE {METRIC_PREFIX}_stage_seconds gauge")
+    for name, values in quantiles.items():
+        if name == "rerun":
+            continue
+        for q, value in values.items():
+            lines.append(f'{METRIC_PREFIX}_stage_seconds{{stage="{_label(name)}",quantile="{q}"}} {value:.6f}')
+    figures = memory_figures()
+    for name, help_text in [
+        ("active_sessions", f"Sessions that reran the script in the last {SESSION_TTL}s."),
+        ("rss_bytes", "Resident memory of the server process."),
+        ("shared_bytes", "Bytes of the datasets held once and shared by all sessions."),
+        ("shared_datasets", "Datasets held in the shared cache."),
+        ("session_bytes", "Memory beyond the startup baseline and shared data, per active session."),
+    ]:
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+        lines.append(f"{METRIC_PREFIX}_{name} {figures[name]:.0f}")
+
+    target = Path(path)
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text("\n".join(lines) + "\n")
+        os.replace(tmp, target)
+    except OSError:
+        pass
@@ -0,0 +1,147 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cube import build_cube
+
+# Partitioned parallel aggregation
+#
+# Rows are split into contiguous Order Date ranges of about equal size, cut on
+# day boundaries. Every cube cell belongs to a single day, so each cell is
+# summed by one worker over the same rows, in the same order, as the serial
+# build_cube; concatenating the partial cubes in date order gives a cube
+# identical to the serial one. Histogram bin counts are integers and add up.
+#
+# Row selection splits the filter engine's packed bitmaps into byte ranges:
+# each worker ORs its slice of every selected value's bitmap, ANDs them with
+# the date bitmap and its own rows' Sales range test, and turns the result into
+# row ids. The ranges concatenate in row order.
+#
+#   SALES_WORKERS    worker count (default 1: serial)
+#   SALES_EXECUTOR   "thread" (default, shares memory) or "process"
+
+DEFAULT_WORKERS = max(1, int(os.environ.get("SALES_WORKERS", "1")))
+DEFAULT_EXECUTOR = os.environ.get("SALES_EXECUTOR", "thread")
+EXECUTORS = ("thread", "process")
+MIN_PARTITION_ROWS = 50_000
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def get_executor(workers, kind=DEFAULT_EXECUTOR):
+    """Process-wide pool per (kind, workers), created on first use."""
+    if kind not in EXECUTORS:
+        raise ValueError(f"Unknown executor: {kind!r}")
+    with _lock:
+        key = (kind, workers)
+        if key not in _executors:
+            if kind == "process":
+                # spawn, not fork: the dashboard server is multi-threaded
+                _executors[key] = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                _executors[key] = ThreadPoolExecutor(workers, thread_name_prefix="sales-agg")
+        return _executors[key]
+
+
+def partition_count(n_rows, workers):
+    return max(1, min(workers, n_rows // MIN_PARTITION_ROWS))
+
+
+def day_partitions(dates, n_parts):
+    """Positions into dates, split into n_parts date ranges cut between days.
+
+    Each partition is in ascending position order and partitions are in date
+    order; fewer come back when there are fewer distinct days than parts.
+    """
+    days = np.asarray(dates, dtype="datetime64[D]")
+    order = np.argsort(days, kind="stable")
+    sorted_days = days[order]
+    cuts = {0, len(order)}
+    for i in range(1, n_parts):
+        target = sorted_days[len(order) * i // n_parts]
+        cuts.add(int(np.searchsorted(sorted_days, target, side="left")))
+    bounds = sorted(cuts)
+    return [np.sort(order[a:b]) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def parallel_cube(df, rows=None, workers=None, executor=DEFAULT_EXECUTOR):
+    """build_cube(df) or build_cube(df.iloc[rows]), computed per date partition."""
+    workers = workers or DEFAULT_WORKERS
+    n_rows = len(df) if rows is None else len(rows)
+    n_parts = partition_count(n_rows, workers)
+    if n_parts == 1:
+        return build_cube(df if rows is None else df.iloc[rows])
+
+    dates = df["Order Date"].to_numpy()
+    if rows is not None:
+        dates = dates[rows]
+    parts = day_partitions(dates, n_parts)
+    if rows is not None:
+        parts = [rows[p] for p in parts]
+
+    pool = get_executor(workers, executor)
+    cubes = list(pool.map(build_cube, (df.iloc[p] for p in parts)))
+    return pd.concat(cubes, ignore_index=True)
+
+
+def _select_block(first_row, base, value_bitmaps, sales, sales_range):
+    # Row ids first_row.. of one byte range of the filter bitmaps
+    bitmap = base.copy()
+    for bitmaps in value_bitmaps:
+        any_value = np.zeros_like(bitmap)
+        for value_bitmap in bitmaps:
+            np.bitwise_or(any_value, value_bitmap, out=any_value)
+        np.bitwise_and(bitmap, any_value, out=bitmap)
+    if sales_range is not None:
+        np.bitwise_and(bitmap, np.packbits((sales >= sales_range[0]) & (sales <= sales_range[1])), out=bitmap)
+    return first_row + np.flatnonzero(np.unpackbits(bitmap, count=len(sales)))
+
+
+def parallel_select(engine, base_bitmap, filters=None, sales_range=None, workers=None,
+                    executor=DEFAULT_EXECUTOR):
+    """engine.select(base_bitmap, filters, sales_range), computed per row range."""
+    workers = workers or DEFAULT_WORKERS
+    n_parts = partition_count(engine.n_rows, workers)
+    if n_parts == 1:
+        return engine.select(base_bitmap, filters, sales_range)
+
+    value_bitmaps = [
+        [engine.bitmaps[dim][value] for value in values if value in engine.bitmaps[dim]]
+        for dim, values in (filters or {}).items()
+    ]
+    cuts = np.linspace(0, len(base_bitmap), n_parts + 1).astype(int)
+    ranges = list(zip(cuts[:-1], cuts[1:]))
+
+    pool = get_executor(workers, executor)
+    rows = pool.map(
+        _select_block,
+        [a * 8 for a, _ in ranges],
+        [base_bitmap[a:b] for a, b in ranges],
+        [[[bitmap[a:b] for bitmap in bitmaps] for bitmaps in value_bitmaps] for a, b in ranges],
+        [engine.sales[a * 8:b * 8] for a, b in ranges],
+        [sales_range] * n_parts,
+    )
+    return np.concatenate(list(rows))
+
+
+def _bin_counts(values, edges):
+    return np.histogram(values, bins=edges)[0]
+
+
+def histogram(values, bins, workers=None, executor=DEFAULT_EXECUTOR):
+    """(counts, edges) like np.histogram, with counts summed over row ranges."""
+    workers = workers or DEFAULT_WORKERS
+    edges = np.histogram_bin_edges(values, bins=bins)
+    n_parts = partition_count(len(values), workers)
+    if n_parts == 1:
+        return np.histogram(values, bins=edges)[0], edges
+
+    pool = get_executor(workers, executor)
+    chunks = np.array_split(values, n_parts)
+    counts = sum(pool.map(_bin_counts, chunks, [edges] * n_parts))
+    return counts, edges
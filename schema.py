@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+# Compact in-memory schema
+#
+# Applied to every parsed frame after dates and the known dimensions are
+# typed (see data_cache.apply_types):
+#
+#   - any other text column whose values repeat enough is dictionary-encoded
+#     (interned) as a categorical: one copy of each distinct string plus
+#     small integer codes per row
+#   - integer columns are downcast to the narrowest type that holds them
+#   - FLOAT32_COLUMNS, whose values carry few significant digits, become
+#     float32; Sales and Profit stay float64 so sums are not affected
+#
+# DASHBOARD_COLUMNS are the columns some view computes on; the rest can be
+# dropped on request to save memory (the Raw Data Viewer and exports then only
+# show the kept columns).
+
+INTERN_RATIO = 0.6
+FLOAT32_COLUMNS = ["Discount"]
+DASHBOARD_COLUMNS = [
+    "Order ID", "Order Date", "Customer ID", "Customer Name", "Segment", "City", "State", "Region",
+    "Product ID", "Category", "Sub-Category", "Product Name", "Ship Mode", "Sales", "Discount", "Profit",
+]
+
+
+def _is_text(series):
+    return series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+
+
+def compact(df):
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+        if _is_text(series):
+            if len(series) and series.nunique(dropna=False) <= INTERN_RATIO * len(series):
+                df[col] = series.astype("category")
+        elif pd.api.types.is_integer_dtype(series.dtype) and not pd.api.types.is_extension_array_dtype(series.dtype):
+            df[col] = pd.to_numeric(series, downcast="integer")
+        elif col in FLOAT32_COLUMNS and pd.api.types.is_float_dtype(series.dtype):
+            df[col] = series.astype(np.float32)
+    return df
+
+
+def unused_columns(df):
+    return [c for c in df.columns if c not in DASHBOARD_COLUMNS]
+
+
+def drop_unused(df):
+    return df.drop(columns=unused_columns(df))
+
+
+def _plain_bytes(series):
+    # What the column would take as read_csv leaves it: object strings and
+    # 64-bit numbers
+    if isinstance(series.dtype, pd.CategoricalDtype) or _is_text(series):
+        return int(series.astype(object).memory_usage(index=False, deep=True))
+    return len(series) * 8
+
+
+def memory_report(df, dropped=()):
+    """Bytes per column as plain read_csv dtypes vs the compact schema."""
+    records = []
+    for col in df.columns:
+        series = df[col]
+        after = 0 if col in dropped else int(series.memory_usage(index=False, deep=True))
+        records.append({
+            "Column": col,
+            "Type": "dropped" if col in dropped else str(series.dtype),
+            "Before (bytes)": _plain_bytes(series),
+            "After (bytes)": after,
+        })
+    report = pd.DataFrame(records)
+    total = pd.DataFrame([{
+        "Column": "Total",
+        "Type": "",
+        "Before (bytes)": report["Before (bytes)"].sum(),
+        "After (bytes)": report["After (bytes)"].sum(),
+    }])
+    report = pd.concat([report, total], ignore_index=True)
+    report["Saved"] = (1 - report["After (bytes)"] / report["Before (bytes)"]).map("{:.0%}".format)
+    return report
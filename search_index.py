@@ -0,0 +1,83 @@
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+# Inverted index for the Raw Data Viewer search box
+#
+# Each text column is factorized into its distinct values. Every distinct value
+# is broken into lowercase trigrams, and each trigram maps to the ids of the
+# values containing it. A search intersects the posting lists of the query's
+# trigrams, confirms the substring match on the few surviving values and
+# expands them to row ids, so the cost follows the vocabulary and the matches
+# rather than the number of rows.
+
+SEARCH_COLUMNS = ["Customer Name", "Product Name", "City", "State", "Order ID", "Product ID"]
+GRAM = 3
+
+
+def text_columns(df):
+    # The requested columns first, then any other text dimension in the data
+    columns = [c for c in SEARCH_COLUMNS if c in df.columns]
+    for col in df.columns:
+        dtype = df[col].dtype
+        if col not in columns and (dtype == object or isinstance(dtype, pd.CategoricalDtype)
+                                   or pd.api.types.is_string_dtype(dtype)):
+            columns.append(col)
+    return columns
+
+
+def trigrams(text):
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+class SearchIndex:
+    def __init__(self, df, columns=None):
+        self.columns = columns or text_columns(df)
+        self.values = []
+        value_rows = []
+        value_counts = []
+
+        for col in self.columns:
+            codes, uniques = pd.factorize(df[col])
+            valid = codes >= 0
+            order = np.argsort(codes[valid], kind="stable")
+            value_rows.append(np.flatnonzero(valid)[order])
+            value_counts.append(np.bincount(codes[valid], minlength=len(uniques)))
+            self.values.extend(str(v).lower() for v in uniques)
+
+        # Rows of value i are value_rows[offsets[i]:offsets[i + 1]]
+        self.value_rows = np.concatenate(value_rows) if value_rows else np.array([], dtype=np.int64)
+        counts = np.concatenate(value_counts) if value_counts else np.array([], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        postings = defaultdict(list)
+        for value_id, value in enumerate(self.values):
+            for gram in trigrams(value):
+                postings[gram].append(value_id)
+        self.postings = {gram: np.array(ids, dtype=np.int64) for gram, ids in postings.items()}
+
+    def candidate_values(self, term):
+        grams = trigrams(term)
+        if not grams:
+            # Shorter than a trigram: scan the vocabulary, not the rows
+            return range(len(self.values))
+        lists = [self.postings.get(gram) for gram in grams]
+        if any(ids is None for ids in lists):
+            return []
+        lists.sort(key=len)
+        candidates = lists[0]
+        for ids in lists[1:]:
+            candidates = np.intersect1d(candidates, ids, assume_unique=True)
+            if len(candidates) == 0:
+                break
+        return candidates
+
+    def search(self, term):
+        """Sorted row ids whose indexed text contains term (case-insensitive)."""
+        term = term.lower()
+        matches = [v for v in self.candidate_values(term) if term in self.values[v]]
+        if not matches:
+            return np.array([], dtype=np.int64)
+        rows = [self.value_rows[self.offsets[v]:self.offsets[v + 1]] for v in matches]
+        return np.unique(np.concatenate(rows))
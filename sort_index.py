@@ -0,0 +1,94 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Per-column sort orders for the Raw Data Viewer
+#
+# The first sort by a column computes the permutation of all row ids that
+# orders it (missing values last) and keeps it. Sorting a selection then only
+# keeps the selected ids from that permutation, in order, which is one linear
+# pass instead of a sort; reversing it gives the descending order. Pages are
+# slices of the sorted ids, so only the rows on screen are ever gathered.
+#
+# When rows are appended (see incremental.py), each built order takes the new
+# rows in by binary search on the column's sort keys instead of a re-sort.
+
+
+def sort_key(series):
+    """Values that order like the column, plus a mask of its missing values."""
+    missing = series.isna().to_numpy()
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        if series.cat.ordered:
+            return codes, missing
+        # Codes follow the category list, which is not sorted once categories
+        # are appended (see incremental.append_frames), so rank them by value;
+        # missing values (-1) map to the spare last slot
+        ranks = np.zeros(len(series.cat.categories) + 1, dtype=np.int64)
+        ranks[series.cat.categories.argsort()] = np.arange(len(series.cat.categories))
+        return ranks[codes], missing
+    if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_datetime64_any_dtype(series.dtype):
+        if pd.api.types.is_extension_array_dtype(series.dtype):
+            return series.to_numpy(dtype=np.float64, na_value=np.nan), missing
+        return series.to_numpy(), missing
+    codes, _ = pd.factorize(series, sort=True)
+    return codes, missing
+
+
+class SortIndex:
+    def __init__(self, df):
+        self.df = df
+        self.n_rows = len(df)
+        self.orders = {}
+        self.lock = threading.Lock()
+
+    def order(self, column):
+        """(row ids sorted by column with missing values last, number of non-missing)."""
+        with self.lock:
+            if column not in self.orders:
+                values, missing = sort_key(self.df[column])
+                present = np.flatnonzero(~missing)
+                order = present[np.argsort(values[present], kind="stable")]
+                dtype = np.int32 if self.n_rows < 2 ** 31 else np.int64
+                self.orders[column] = (
+                    np.concatenate([order, np.flatnonzero(missing)]).astype(dtype),
+                    len(present),
+                )
+            return self.orders[column]
+
+    def appended(self, df):
+        """A SortIndex of df, these rows followed by new ones, keeping the built orders."""
+        index = SortIndex(df)
+        with self.lock:
+            orders = dict(self.orders)
+        new_ids = np.arange(self.n_rows, len(df))
+        dtype = np.int32 if len(df) < 2 ** 31 else np.int64
+        for column, (order, n_present) in orders.items():
+            # Keys are taken over the whole column, so codes compare across old and new rows
+            values, missing = sort_key(df[column])
+            new_present = new_ids[~missing[self.n_rows:]]
+            new_present = new_present[np.argsort(values[new_present], kind="stable")]
+            old_present = order[:n_present]
+            at = np.searchsorted(values[old_present], values[new_present], side="right")
+            index.orders[column] = (
+                np.concatenate([
+                    np.insert(old_present, at, new_present),
+                    order[n_present:],
+                    new_ids[missing[self.n_rows:]],
+                ]).astype(dtype),
+                n_present + len(new_present),
+            )
+        return index
+
+    def sort_rows(self, rows, column, ascending=True):
+        """The row ids in rows, ordered by column; missing values stay last."""
+        order, n_present = self.order(column)
+        present, missing = order[:n_present], order[n_present:]
+        if len(rows) < self.n_rows:
+            selected = np.zeros(self.n_rows, dtype=bool)
+            selected[rows] = True
+            present, missing = present[selected[present]], missing[selected[missing]]
+        if not ascending:
+            present = present[::-1]
+        return np.concatenate([present, missing])
@@ -0,0 +1,246 @@
+import os
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cube import DISCOUNT_BIN, DISCOUNT_BIN_DECIMALS, discount_impact
+from distinct import DISTINCT_IDS, count_deltas, order_kpis
+from streaming import DEFAULT_CHUNKSIZE, HISTOGRAM_BINS, file_signature, iter_chunks
+from timeseries import DEFAULT_COMPARISON, DailySeries
+
+# Embedded SQL backend
+#
+# The sales file is streamed once into a SQLite database under SQL_DIR with
+# indexes on order_date, region and category. The sidebar filters compile to
+# one WHERE clause and every chart table is its own GROUP BY query, so only
+# aggregated rows come back into pandas. The database is named after the
+# source file's size and mtime, so a changed file gets a fresh one; bump
+# SQL_VERSION whenever the table changes.
+#
+# Order, customer and product IDs are stored too, so Total Orders and Avg
+# Order Value count DISTINCT order IDs as the in-memory path does.
+#
+# Query results have the same shape as cube.summarize_cube (plus the Sales
+# histogram of streaming.stream_aggregates), so the same views draw them.
+
+SQL_DIR = Path(os.environ.get("SALES_SQL_DIR", ".cache/sql"))
+SQL_VERSION = "2"
+TABLE = "sales"
+SQL_COLUMNS = {
+    "Order Date": "order_date",
+    "Region": "region",
+    "Category": "category",
+    "Segment": "segment",
+    "Sales": "sales",
+    "Profit": "profit",
+    "Discount": "discount",
+    "Order ID": "order_id",
+    "Customer ID": "customer_id",
+    "Product ID": "product_id",
+}
+ID_COLUMNS = {name: SQL_COLUMNS[column] for name, column in DISTINCT_IDS.items()}
+INDEXED_COLUMNS = ["order_date", "region", "category"]
+
+MONTH = "strftime('%Y-%m', order_date)"
+QUARTER = "strftime('%Y', order_date) || 'Q' || ((CAST(strftime('%m', order_date) AS INTEGER) + 2) / 3)"
+
+
+def database_path(csv_path, sql_dir=None):
+    size, mtime_ns = file_signature(csv_path)
+    return Path(sql_dir or SQL_DIR) / f"{Path(csv_path).stem}_{size}_{mtime_ns}_v{SQL_VERSION}.sqlite"
+
+
+def build_database(csv_path, sql_dir=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Load the file into SQLite (once per file version) and return the db path."""
+    path = database_path(csv_path, sql_dir)
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.unlink(missing_ok=True)
+
+    with closing(sqlite3.connect(tmp_path)) as conn:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute(
+            f"CREATE TABLE {TABLE} (order_date TEXT, region TEXT, category TEXT, segment TEXT, "
+            "sales REAL, profit REAL, discount REAL, order_id TEXT, customer_id TEXT, product_id TEXT)"
+        )
+        for chunk in iter_chunks(csv_path, chunksize):
+            # IDs missing from the file are stored as NULL and never counted
+            rows = chunk.reindex(columns=list(SQL_COLUMNS)).rename(columns=SQL_COLUMNS)
+            rows["order_date"] = rows["order_date"].dt.strftime("%Y-%m-%d")
+            for column in ID_COLUMNS.values():
+                rows[column] = rows[column].astype(object).where(rows[column].notna(), None)
+            conn.executemany(
+                f"INSERT INTO {TABLE} VALUES ({', '.join('?' * len(SQL_COLUMNS))})",
+                rows.itertuples(index=False, name=None),
+            )
+        for column in INDEXED_COLUMNS:
+            conn.execute(f"CREATE INDEX idx_{column} ON {TABLE} ({column})")
+        conn.execute("ANALYZE")
+        conn.commit()
+    os.replace(tmp_path, path)
+    return path
+
+
+def compile_filters(date_range=None, regions=None, categories=None, sales_range=None):
+    """WHERE clause and parameters for the sidebar filters."""
+    clauses = []
+    params = []
+    if date_range is not None:
+        clauses.append("order_date BETWEEN ? AND ?")
+        params += [pd.Timestamp(date_range[0]).strftime("%Y-%m-%d"),
+                   pd.Timestamp(date_range[1]).strftime("%Y-%m-%d")]
+    for column, values in [("region", regions), ("category", categories)]:
+        if values is not None:
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})" if values else "0")
+            params += list(values)
+    if sales_range is not None:
+        clauses.append("sales BETWEEN ? AND ?")
+        params += [float(sales_range[0]), float(sales_range[1])]
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+class SqlBackend:
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+
+    def query(self, sql, params=()):
+        uri = f"file:{self.db_path}?mode=ro"
+        with closing(sqlite3.connect(uri, uri=True)) as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def distinct(self, column):
+        return self.query(f"SELECT DISTINCT {column} FROM {TABLE} ORDER BY {column}")[column].tolist()
+
+    def bounds(self):
+        totals = self.query(
+            f"SELECT MIN(order_date) AS min_date, MAX(order_date) AS max_date, "
+            f"MIN(sales) AS min_sales, MAX(sales) AS max_sales, COUNT(*) AS rows FROM {TABLE}"
+        ).iloc[0]
+        return {
+            "min_date": pd.Timestamp(totals["min_date"]) if totals["rows"] else None,
+            "max_date": pd.Timestamp(totals["max_date"]) if totals["rows"] else None,
+            "min_sales": totals["min_sales"],
+            "max_sales": totals["max_sales"],
+            "regions": self.distinct("region"),
+            "categories": self.distinct("category"),
+            "rows": int(totals["rows"]),
+        }
+
+    def daily_series(self, regions=None, categories=None, sales_range=None):
+        where, params = compile_filters(None, regions, categories, sales_range)
+        days = self.query(
+            f"SELECT order_date AS \"Order Date\", SUM(sales) AS Sales, SUM(profit) AS Profit, "
+            f"COUNT(*) AS Orders FROM {TABLE} {where} GROUP BY order_date",
+            params,
+        )
+        days["Order Date"] = pd.to_datetime(days["Order Date"])
+        return DailySeries(days.set_index("Order Date"))
+
+    def distinct_counts(self, date_range=None, regions=None, categories=None, sales_range=None):
+        """Distinct orders, customers and products of the filters, e.g. {"orders": 5009, ...}."""
+        where, params = compile_filters(date_range, regions, categories, sales_range)
+        counts = self.query(
+            "SELECT " + ", ".join(f"COUNT(DISTINCT {column}) AS {name}" for name, column in ID_COLUMNS.items())
+            + f" FROM {TABLE} {where}",
+            params,
+        ).iloc[0]
+        return {name: int(counts[name]) for name in ID_COLUMNS}
+
+    def sales_histogram(self, where, params, sales_range, sales_bounds):
+        lo, hi = sales_range if sales_range is not None else sales_bounds
+        edges = np.linspace(lo, hi, HISTOGRAM_BINS + 1)
+        width = (hi - lo) / HISTOGRAM_BINS or 1.0
+        bins = self.query(
+            f"SELECT MIN(CAST((sales - ?) / ? AS INTEGER), {HISTOGRAM_BINS - 1}) AS bin, COUNT(*) AS n "
+            f"FROM {TABLE} {where} GROUP BY bin",
+            [lo, width] + params,
+        )
+        counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        counts[bins["bin"].clip(0, HISTOGRAM_BINS - 1).to_numpy()] = bins["n"].to_numpy()
+        return counts, edges
+
+    def aggregates(self, sales_bounds, date_range=None, regions=None, categories=None,
+                   sales_range=None, comparison=DEFAULT_COMPARISON):
+        """KPIs and chart tables for the filters, computed by SQL; None when nothing matches."""
+        where, params = compile_filters(date_range, regions, categories, sales_range)
+
+        totals = self.query(
+            f"SELECT SUM(sales) AS sales, SUM(profit) AS profit, SUM(discount) AS discount, "
+            f"COUNT(*) AS orders FROM {TABLE} {where}",
+            params,
+        ).iloc[0]
+        total_orders = int(totals["orders"])
+        if total_orders == 0:
+            return None
+        total_sales, total_profit = totals["sales"], totals["profit"]
+
+        by_category = self.query(
+            f"SELECT category AS Category, SUM(sales) AS Sales, SUM(profit) AS Profit "
+            f"FROM {TABLE} {where} GROUP BY category ORDER BY category",
+            params,
+        ).set_index("Category")
+        by_region = self.query(
+            f"SELECT region AS Region, SUM(sales) AS Sales, SUM(profit) AS Profit, COUNT(*) AS Orders "
+            f"FROM {TABLE} {where} GROUP BY region ORDER BY region",
+            params,
+        ).set_index("Region")
+        monthly = self.query(
+            f"SELECT {MONTH} AS \"Order Date\", SUM(sales) AS Sales "
+            f"FROM {TABLE} {where} GROUP BY 1 ORDER BY 1",
+            params,
+        )
+        quarterly = self.query(
+            f"SELECT {QUARTER} AS Quarter, category AS Category, SUM(sales) AS Sales "
+            f"FROM {TABLE} {where} GROUP BY 1, 2 ORDER BY 1, 2",
+            params,
+        )
+        discount_bins = self.query(
+            f"SELECT ROUND(discount, {DISCOUNT_BIN_DECIMALS}) AS \"{DISCOUNT_BIN}\", SUM(sales) AS Sales, "
+            f"SUM(profit) AS Profit, COUNT(*) AS Orders FROM {TABLE} {where} GROUP BY 1",
+            params,
+        )
+
+        regional = by_region.reset_index()
+        regional.columns = ["Region", "Total Sales", "Total Profit", "Order Count"]
+        regional["Profit Margin"] = (regional["Total Profit"] / regional["Total Sales"] * 100).round(2)
+        margin = (by_category["Profit"] / by_category["Sales"] * 100).where(by_category["Sales"] > 0, 0)
+
+        kpis = {
+            "total_sales": total_sales,
+            "total_profit": total_profit,
+            "avg_discount": totals["discount"] / total_orders * 100,
+            "profit_margin": (total_profit / total_sales * 100) if total_sales > 0 else 0,
+            "total_orders": total_orders,
+            "avg_order_value": total_sales / total_orders if total_orders > 0 else 0,
+        }
+        series = self.daily_series(regions, categories, sales_range)
+        kpis.update(series.compare(comparison, date_range))
+        # Files without an ID column count no distinct values of it
+        counts = self.distinct_counts(date_range, regions, categories, sales_range)
+        kpis = order_kpis(kpis, dict({name: n for name, n in counts.items() if n > 0}, estimated=False))
+        if counts["orders"] > 0 and len(series) > 0:
+            current_window, previous_window = series.windows(comparison, date_range)
+            kpis.update(count_deltas(
+                self.distinct_counts(current_window, regions, categories, sales_range),
+                self.distinct_counts(previous_window, regions, categories, sales_range),
+            ))
+
+        return {
+            "kpis": kpis,
+            "sales_by_category": by_category["Sales"].reset_index(),
+            "sales_by_region": by_region["Sales"].reset_index(),
+            "profit_margin_by_cat": margin.rename("Profit Margin").reset_index(),
+            "monthly_sales": monthly,
+            "quarterly_data": quarterly,
+            "regional_performance": regional,
+            "discount_impact": discount_impact(discount_bins),
+            "best_region": by_region["Sales"].idxmax(),
+            "best_category": by_category["Profit"].idxmax(),
+            "sales_histogram": self.sales_histogram(where, params, sales_range, sales_bounds),
+        }
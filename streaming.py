@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from cube import build_cube, merge_cubes, summarize_cube
+from data_cache import CSV_ENCODING, parse_dates
+from distinct import DISTINCT_IDS, DaySketches, count_deltas, order_kpis
+from timeseries import HALVES, DailySeries
+
+# Out-of-core ingestion
+#
+# Files too large for memory are read in fixed-size chunks and folded into the
+# small aggregates the dashboard displays: a sales cube (see cube.py),
+# fixed-edge Sales histogram bins and per-day HyperLogLog sketches of the
+# order, customer and product IDs (see distinct.py), from which Total Orders
+# and its delta are estimated. All are bounded by the calendar and the
+# dimension cardinality, never by the number of rows.
+
+DEFAULT_CHUNKSIZE = 250_000
+HISTOGRAM_BINS = 30
+STREAM_COLUMNS = ["Order Date", "Region", "Category", "Segment", "Sales", "Profit", "Discount",
+                  *DISTINCT_IDS.values()]
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def iter_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    reader = pd.read_csv(
+        path,
+        encoding=CSV_ENCODING,
+        usecols=lambda c: c.strip() in STREAM_COLUMNS,
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        chunk.columns = chunk.columns.str.strip()
+        chunk["Order Date"] = parse_dates(chunk["Order Date"])
+        yield chunk
+
+
+def scan_bounds(path, chunksize=DEFAULT_CHUNKSIZE):
+    """First pass: value ranges and dimension members needed to build the filters."""
+    bounds = {
+        "min_date": None, "max_date": None,
+        "min_sales": np.inf, "max_sales": -np.inf,
+        "regions": set(), "categories": set(), "rows": 0,
+    }
+    for chunk in iter_chunks(path, chunksize):
+        dates = chunk["Order Date"]
+        if bounds["min_date"] is None:
+            bounds["min_date"], bounds["max_date"] = dates.min(), dates.max()
+        else:
+            bounds["min_date"] = min(bounds["min_date"], dates.min())
+            bounds["max_date"] = max(bounds["max_date"], dates.max())
+        bounds["min_sales"] = min(bounds["min_sales"], chunk["Sales"].min())
+        bounds["max_sales"] = max(bounds["max_sales"], chunk["Sales"].max())
+        bounds["regions"].update(chunk["Region"].dropna().unique())
+        bounds["categories"].update(chunk["Category"].dropna().unique())
+        bounds["rows"] += len(chunk)
+    bounds["regions"] = sorted(bounds["regions"])
+    bounds["categories"] = sorted(bounds["categories"])
+    return bounds
+
+
+def _filter_chunk(chunk, date_range, regions, categories, sales_range):
+    mask = np.ones(len(chunk), dtype=bool)
+    if date_range is not None:
+        start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1])
+        day = chunk["Order Date"].dt.normalize()
+        mask &= ((day >= start) & (day <= end)).to_numpy()
+    if regions is not None:
+        mask &= chunk["Region"].isin(regions).to_numpy()
+    if categories is not None:
+        mask &= chunk["Category"].isin(categories).to_numpy()
+    if sales_range is not None:
+        mask &= ((chunk["Sales"] >= sales_range[0]) & (chunk["Sales"] <= sales_range[1])).to_numpy()
+    return chunk[mask]
+
+
+def stream_aggregates(path, sales_bounds, date_range=None, regions=None, categories=None,
+                      sales_range=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Second pass: fold filtered chunks into a sales cube, histogram bins and ID sketches."""
+    lo, hi = sales_range if sales_range is not None else sales_bounds
+    edges = np.linspace(lo, hi, HISTOGRAM_BINS + 1)
+    hist_counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+    cube = None
+    sketches = DaySketches()
+
+    for chunk in iter_chunks(path, chunksize):
+        chunk = _filter_chunk(chunk, date_range, regions, categories, sales_range)
+        if chunk.empty:
+            continue
+        cube = merge_cubes([cube, build_cube(chunk)])
+        hist_counts += np.histogram(chunk["Sales"].to_numpy(), bins=edges)[0]
+        sketches.add(chunk)
+
+    if cube is None:
+        return None
+    aggs = summarize_cube(cube)
+    # Same halves as the deltas summarize_cube computes
+    current, previous = DailySeries.from_cube(cube).windows(HALVES)
+    aggs["kpis"] = order_kpis(aggs["kpis"], dict(sketches.count(), estimated=True))
+    aggs["kpis"].update(count_deltas(sketches.count(current), sketches.count(previous)))
+    aggs["sales_histogram"] = (hist_counts, edges)
+    return aggs
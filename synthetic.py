@@ -0,0 +1,286 @@
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from data_cache import DATE_FORMAT, HAS_PYARROW
+
+if HAS_PYARROW:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+# Synthetic Superstore generator
+#
+# Produces rows with the full superstore.csv schema at any scale, in chunks so
+# 50M-row files can be written without holding them in memory. Cardinalities
+# follow the real file at small scales (about two lines per order, ~800
+# customers, ~1.9k products, ~600 cities in 49 states) and grow sublinearly
+# with the row count, up to fixed caps.
+
+COLUMNS = [
+    "Row ID", "Order ID", "Order Date", "Ship Date", "Ship Mode", "Customer ID",
+    "Customer Name", "Segment", "Country", "City", "State", "Postal Code", "Region",
+    "Product ID", "Category", "Sub-Category", "Product Name", "Sales", "Quantity",
+    "Discount", "Profit",
+]
+
+STATE_REGIONS = {
+    "Alabama": "South", "Arizona": "West", "Arkansas": "South", "California": "West",
+    "Colorado": "West", "Connecticut": "East", "Delaware": "East",
+    "District of Columbia": "East", "Florida": "South", "Georgia": "South",
+    "Idaho": "West", "Illinois": "Central", "Indiana": "Central", "Iowa": "Central",
+    "Kansas": "Central", "Kentucky": "South", "Louisiana": "South", "Maine": "East",
+    "Maryland": "East", "Massachusetts": "East", "Michigan": "Central",
+    "Minnesota": "Central", "Mississippi": "South", "Missouri": "Central",
+    "Montana": "West", "Nebraska": "Central", "Nevada": "West", "New Hampshire": "East",
+    "New Jersey": "East", "New Mexico": "West", "New York": "East",
+    "North Carolina": "South", "North Dakota": "Central", "Ohio": "East",
+    "Oklahoma": "Central", "Oregon": "West", "Pennsylvania": "East",
+    "Rhode Island": "East", "South Carolina": "South", "South Dakota": "Central",
+    "Tennessee": "South", "Texas": "Central", "Utah": "West", "Vermont": "East",
+    "Virginia": "South", "Washington": "West", "West Virginia": "East",
+    "Wisconsin": "Central", "Wyoming": "West",
+}
+
+# Sub-Category -> (Category, ID code, median unit price, base margin)
+SUB_CATEGORIES = {
+    "Bookcases": ("Furniture", "BO", 140.0, 0.05),
+    "Chairs": ("Furniture", "CH", 160.0, 0.10),
+    "Furnishings": ("Furniture", "FU", 25.0, 0.18),
+    "Tables": ("Furniture", "TA", 220.0, -0.02),
+    "Appliances": ("Office Supplies", "AP", 70.0, 0.20),
+    "Art": ("Office Supplies", "AR", 9.0, 0.25),
+    "Binders": ("Office Supplies", "BI", 20.0, 0.22),
+    "Envelopes": ("Office Supplies", "EN", 20.0, 0.42),
+    "Fasteners": ("Office Supplies", "FA", 4.0, 0.30),
+    "Labels": ("Office Supplies", "LA", 5.0, 0.44),
+    "Paper": ("Office Supplies", "PA", 16.0, 0.43),
+    "Storage": ("Office Supplies", "ST", 75.0, 0.10),
+    "Supplies": ("Office Supplies", "SU", 40.0, 0.05),
+    "Accessories": ("Technology", "AC", 70.0, 0.24),
+    "Copiers": ("Technology", "CO", 700.0, 0.37),
+    "Machines": ("Technology", "MA", 330.0, 0.05),
+    "Phones": ("Technology", "PH", 120.0, 0.14),
+}
+CATEGORY_CODES = {"Furniture": "FUR", "Office Supplies": "OFF", "Technology": "TEC"}
+
+SHIP_MODES = ["Standard Class", "Second Class", "First Class", "Same Day"]
+SHIP_MODE_P = [0.60, 0.19, 0.15, 0.06]
+SHIP_DAYS = {"Standard Class": (4, 8), "Second Class": (2, 6), "First Class": (1, 4), "Same Day": (0, 1)}
+SEGMENTS = ["Consumer", "Corporate", "Home Office"]
+SEGMENT_P = [0.52, 0.30, 0.18]
+DISCOUNTS = [0.0, 0.1, 0.15, 0.2, 0.3, 0.32, 0.4, 0.45, 0.5, 0.6, 0.7, 0.8]
+DISCOUNT_P = [0.48, 0.01, 0.01, 0.37, 0.02, 0.003, 0.02, 0.001, 0.006, 0.014, 0.04, 0.03]
+MONTH_WEIGHTS = [0.5, 0.4, 0.8, 0.7, 0.7, 0.7, 0.7, 0.7, 1.4, 0.8, 1.5, 1.5]
+
+FIRST_NAMES = [
+    "Claire", "Darrin", "Sean", "Brosina", "Andrew", "Irene", "Harold", "Pete", "Alejandro",
+    "Zuschuss", "Ken", "Sandra", "Emily", "Eric", "Tracy", "Matt", "Gene", "Steve", "Linda",
+    "Ruben", "Erin", "Odella", "Patrick", "Lena", "Janet", "Ted", "Kunst", "Hunter",
+]
+LAST_NAMES = [
+    "Gute", "Van Huff", "O'Donnell", "Hoffman", "Allen", "Maddox", "Pawlan", "Kriz",
+    "Grove", "Donatelli", "Black", "Flanagan", "Grady", "Hoffmann", "Blumstein", "Abelman",
+    "Hale", "Nguyen", "Cazares", "Ausman", "Smith", "Byrd", "O'Brian", "Creighton",
+    "Molinari", "Butterfield", "Miller", "Lopez",
+]
+CITY_STEMS = [
+    "Spring", "Oak", "River", "Lake", "Fair", "Green", "Clear", "Maple", "Cedar", "Elm",
+    "Pine", "Ash", "Stone", "Brook", "Mill", "Glen", "Wood", "Hill", "Bay", "Rock",
+    "Sun", "Red", "West", "North", "Grand", "Port", "Salem", "Frank", "Clay", "Union",
+]
+CITY_SUFFIXES = [
+    "field", "ville", "ton", "port", "dale", "wood", "ford", "view", "burg", "haven",
+    "mont", "land", " City", " Falls", " Springs", "ridge", "worth", "bury", " Heights", "side",
+]
+BRANDS = [
+    "Bush", "Hon", "Global", "Fellowes", "Avery", "Xerox", "Logitech", "Canon", "Cisco",
+    "Acco", "Eldon", "Staples", "Hewlett", "Samsung", "Belkin", "Tenex", "Safco", "Wilson",
+]
+
+
+def _clamp(value, low, high):
+    return int(min(max(value, low), high))
+
+
+def scale_cardinalities(n_rows):
+    return {
+        "customers": _clamp(n_rows // 12, 800, 2_000_000),
+        "products": _clamp(n_rows // 5, 1_900, 250_000),
+        "cities": _clamp(n_rows // 16, 600, len(CITY_STEMS) * len(CITY_SUFFIXES)),
+    }
+
+
+def _dimension_tables(n_rows, seed):
+    rng = np.random.default_rng(seed)
+    sizes = scale_cardinalities(n_rows)
+
+    # Geography: cities spread over the states, weighted like a population
+    states = list(STATE_REGIONS)
+    city_names = [stem + suffix for stem in CITY_STEMS for suffix in CITY_SUFFIXES]
+    city_names = list(rng.permutation(city_names)[:sizes["cities"]])
+    city_state = rng.choice(len(states), size=len(city_names), p=_zipf_weights(len(states), rng))
+    cities = pd.DataFrame({
+        "City": city_names,
+        "State": [states[i] for i in city_state],
+        "Postal Code": rng.integers(10_000, 99_999, len(city_names)),
+    })
+    cities["Region"] = cities["State"].map(STATE_REGIONS)
+
+    # Customers, each with a home city and a segment
+    n_customers = sizes["customers"]
+    first = rng.integers(0, len(FIRST_NAMES), n_customers)
+    last = rng.integers(0, len(LAST_NAMES), n_customers)
+    initials = (pd.Series(np.array(FIRST_NAMES)[first]).str[0]
+                + pd.Series(np.array(LAST_NAMES)[last]).str[0])
+    customers = pd.DataFrame({
+        "Customer ID": initials + "-" + pd.Series(10_000 + np.arange(n_customers)).astype(str),
+        "Customer Name": (pd.Series(np.array(FIRST_NAMES)[first]) + " "
+                          + pd.Series(np.array(LAST_NAMES)[last])),
+        "Segment": rng.choice(SEGMENTS, n_customers, p=SEGMENT_P),
+        "city": rng.choice(len(cities), n_customers, p=_zipf_weights(len(cities), rng)),
+    })
+
+    # Products with a sub-category, unit price and margin
+    n_products = sizes["products"]
+    subs = list(SUB_CATEGORIES)
+    sub = rng.integers(0, len(subs), n_products)
+    meta = [SUB_CATEGORIES[subs[i]] for i in sub]
+    category = [m[0] for m in meta]
+    products = pd.DataFrame({
+        "Product ID": [f"{CATEGORY_CODES[m[0]]}-{m[1]}-{10_000_000 + i}" for i, m in enumerate(meta)],
+        "Category": category,
+        "Sub-Category": [subs[i] for i in sub],
+        "Product Name": [f"{BRANDS[b]} {subs[s]} Model {i % 997}"
+                         for i, (b, s) in enumerate(zip(rng.integers(0, len(BRANDS), n_products), sub))],
+        "unit_price": np.array([m[2] for m in meta]) * rng.lognormal(0, 0.6, n_products),
+        "margin": np.array([m[3] for m in meta]),
+    })
+    return cities, customers, products
+
+
+def _zipf_weights(n, rng):
+    weights = 1.0 / np.arange(1, n + 1) ** 0.8
+    weights = rng.permutation(weights)
+    return weights / weights.sum()
+
+
+def _order_days(start, end):
+    days = pd.date_range(start, end, freq="D")
+    weights = np.array(MONTH_WEIGHTS)[days.month - 1]
+    return days, weights / weights.sum()
+
+
+def generate_chunk(tables, first_row, n_rows, first_order, rng, start="2014-01-01", end="2017-12-31"):
+    """n_rows synthetic lines starting at Row ID first_row + 1 and order number first_order."""
+    cities, customers, products = tables
+
+    # Orders of 1-5 lines (about two on average), truncated to the chunk size
+    lines = rng.choice([1, 2, 3, 4, 5], size=n_rows // 2 + 1, p=[0.4, 0.3, 0.15, 0.1, 0.05])
+    order_of_line = np.repeat(np.arange(len(lines)), lines)[:n_rows]
+    n_orders = order_of_line[-1] + 1
+
+    days, day_p = _order_days(start, end)
+    order_dates = days[rng.choice(len(days), n_orders, p=day_p)]
+    ship_mode = rng.choice(len(SHIP_MODES), n_orders, p=SHIP_MODE_P)
+    low = np.array([SHIP_DAYS[m][0] for m in SHIP_MODES])[ship_mode]
+    high = np.array([SHIP_DAYS[m][1] for m in SHIP_MODES])[ship_mode]
+    ship_dates = order_dates + pd.to_timedelta(rng.integers(low, high), unit="D")
+    customer = rng.integers(0, len(customers), n_orders)
+    prefix = np.where(rng.random(n_orders) < 0.8, "CA", "US")
+    order_ids = (pd.Series(prefix) + "-" + pd.Series(order_dates.year).astype(str) + "-"
+                 + pd.Series(100_000 + first_order + np.arange(n_orders)).astype(str))
+
+    cust = customers.iloc[customer[order_of_line]].reset_index(drop=True)
+    geo = cities.iloc[cust["city"].to_numpy()].reset_index(drop=True)
+    prod = products.iloc[rng.integers(0, len(products), n_rows)].reset_index(drop=True)
+
+    quantity = np.minimum(rng.geometric(0.3, n_rows), 14)
+    discount = rng.choice(DISCOUNTS, n_rows, p=np.array(DISCOUNT_P) / sum(DISCOUNT_P))
+    sales = np.round(prod["unit_price"].to_numpy() * quantity * (1 - discount), 4)
+    margin = prod["margin"].to_numpy() - 1.1 * discount + rng.normal(0, 0.08, n_rows)
+    profit = np.round(sales * margin, 4)
+
+    return pd.DataFrame({
+        "Row ID": first_row + 1 + np.arange(n_rows),
+        "Order ID": order_ids.to_numpy()[order_of_line],
+        "Order Date": order_dates[order_of_line],
+        "Ship Date": ship_dates[order_of_line],
+        "Ship Mode": np.array(SHIP_MODES)[ship_mode][order_of_line],
+        "Customer ID": cust["Customer ID"],
+        "Customer Name": cust["Customer Name"],
+        "Segment": cust["Segment"],
+        "Country": "United States",
+        "City": geo["City"],
+        "State": geo["State"],
+        "Postal Code": geo["Postal Code"],
+        "Region": geo["Region"],
+        "Product ID": prod["Product ID"],
+        "Category": prod["Category"],
+        "Sub-Category": prod["Sub-Category"],
+        "Product Name": prod["Product Name"],
+        "Sales": sales,
+        "Quantity": quantity,
+        "Discount": discount,
+        "Profit": profit,
+    })[COLUMNS], n_orders
+
+
+def iter_superstore(n_rows, chunk_rows=1_000_000, seed=0):
+    tables = _dimension_tables(n_rows, seed)
+    first_row = first_order = 0
+    chunk_index = 0
+    while first_row < n_rows:
+        size = min(chunk_rows, n_rows - first_row)
+        rng = np.random.default_rng([seed, chunk_index])
+        chunk, n_orders = generate_chunk(tables, first_row, size, first_order, rng)
+        yield chunk
+        first_row += size
+        first_order += n_orders
+        chunk_index += 1
+
+
+def generate_superstore(n_rows, seed=0):
+    """Synthetic Superstore frame with n_rows rows, typed like a parsed load."""
+    return pd.concat(iter_superstore(n_rows, seed=seed), ignore_index=True)
+
+
+def _format_dates(series):
+    # Few distinct days, so format each once instead of once per row
+    codes, uniques = pd.factorize(series)
+    return np.asarray(uniques.strftime(DATE_FORMAT))[codes]
+
+
+def write_superstore_csv(path, n_rows, chunk_rows=1_000_000, seed=0):
+    """Write n_rows synthetic rows to a CSV laid out like superstore.csv."""
+    writer = None
+    with open(path, "wb") as fh:
+        for i, chunk in enumerate(iter_superstore(n_rows, chunk_rows, seed)):
+            for col in ("Order Date", "Ship Date"):
+                chunk[col] = _format_dates(chunk[col])
+            if not HAS_PYARROW:
+                chunk.to_csv(fh, index=False, header=i == 0)
+                continue
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pa_csv.CSVWriter(fh, table.schema)
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic Superstore-shaped CSV.")
+    parser.add_argument("rows", type=int, help="number of rows")
+    parser.add_argument("path", help="output CSV path")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    write_superstore_csv(args.path, args.rows, seed=args.seed)
+    print(f"wrote {args.rows:,} rows to {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
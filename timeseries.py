@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+# Daily prefix-sum series
+#
+# Sales, Profit and order counts summed per day, stored as running totals with
+# a leading zero. The total over any day window is two binary searches and a
+# subtraction, so every period-over-period comparison is answered without
+# touching rows or cube cells again.
+
+SERIES_MEASURES = ["Sales", "Profit", "Orders"]
+
+PREVIOUS_PERIOD = "Previous period"
+LAST_YEAR = "Same period last year"
+ROLLING_30 = "Rolling 30 days"
+ROLLING_90 = "Rolling 90 days"
+HALVES = "First vs second half"
+COMPARISON_MODES = [PREVIOUS_PERIOD, LAST_YEAR, ROLLING_30, ROLLING_90, HALVES]
+ROLLING_DAYS = {ROLLING_30: 30, ROLLING_90: 90}
+# The default selection spans every date, so it has no previous period;
+# halves always have orders on both sides
+DEFAULT_COMPARISON = HALVES
+
+ONE_DAY = pd.Timedelta(days=1)
+
+
+def percent_change(current, previous):
+    return (current - previous) / previous * 100 if previous > 0 else 0
+
+
+class DailySeries:
+    def __init__(self, day_totals):
+        day_totals = day_totals.sort_index()
+        self.days = day_totals.index.to_numpy(dtype="datetime64[ns]")
+        self.cumulative = {
+            m: np.concatenate([[0], np.cumsum(day_totals[m].to_numpy(dtype=np.float64))])
+            for m in SERIES_MEASURES
+        }
+
+    @classmethod
+    def from_cube(cls, cube):
+        return cls(cube.groupby("Order Date")[SERIES_MEASURES].sum())
+
+    @classmethod
+    def from_frame(cls, df):
+        rows = pd.DataFrame({
+            "Order Date": df["Order Date"].dt.normalize(),
+            "Sales": df["Sales"],
+            "Profit": df["Profit"],
+            "Orders": np.ones(len(df), dtype=np.int64),
+        })
+        return cls(rows.groupby("Order Date")[SERIES_MEASURES].sum())
+
+    def __len__(self):
+        return len(self.days)
+
+    def _positions(self, start, end):
+        lo = np.searchsorted(self.days, np.datetime64(pd.Timestamp(start), "ns"), side="left")
+        hi = np.searchsorted(self.days, np.datetime64(pd.Timestamp(end), "ns"), side="right")
+        return lo, max(lo, hi)
+
+    def totals(self, start, end):
+        """Sales, Profit and Orders over the inclusive day window [start, end]."""
+        lo, hi = self._positions(start, end)
+        return {m: cum[hi] - cum[lo] for m, cum in self.cumulative.items()}
+
+    def split_day(self, start, end):
+        # Day on which Series.quantile(0.5) of the window's order dates falls.
+        # The median interpolates between the floor/ceil order statistics, so
+        # orders on or after the day holding the upper one are the second half
+        lo, hi = self._positions(start, end)
+        if lo == hi:
+            return pd.Timestamp(start)
+        orders = self.cumulative["Orders"]
+        pos = 0.5 * (orders[hi] - orders[lo] - 1)
+        upper = np.searchsorted(orders[lo + 1:hi + 1], orders[lo] + np.ceil(pos) + 1)
+        return pd.Timestamp(self.days[lo + upper])
+
+    def windows(self, mode, date_range=None):
+        """Current and comparison (start, end) windows for a comparison mode."""
+        if date_range is not None:
+            start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1])
+        else:
+            start, end = pd.Timestamp(self.days[0]), pd.Timestamp(self.days[-1])
+
+        if mode == PREVIOUS_PERIOD:
+            length = end - start + ONE_DAY
+            return (start, end), (start - length, start - ONE_DAY)
+        if mode == LAST_YEAR:
+            year = pd.DateOffset(years=1)
+            return (start, end), (start - year, end - year)
+        if mode in ROLLING_DAYS:
+            span = pd.Timedelta(days=ROLLING_DAYS[mode])
+            return (end - span + ONE_DAY, end), (end - 2 * span + ONE_DAY, end - span)
+        if mode == HALVES:
+            split = self.split_day(start, end)
+            return (split, end), (start, split - ONE_DAY)
+        raise ValueError(f"Unknown comparison mode: {mode!r}")
+
+    def compare(self, mode=DEFAULT_COMPARISON, date_range=None):
+        """Percent change of the current window over the comparison window.
+
+        Deltas are None when the comparison window holds no orders.
+        """
+        if len(self) == 0:
+            return {"sales_delta": None, "profit_delta": None, "orders_delta": None,
+                    "comparison": mode, "comparison_start": None, "comparison_end": None}
+        current_window, previous_window = self.windows(mode, date_range)
+        current = self.totals(*current_window)
+        previous = self.totals(*previous_window)
+        has_history = previous["Orders"] > 0
+        return {
+            "sales_delta": percent_change(current["Sales"], previous["Sales"]) if has_history else None,
+            "profit_delta": percent_change(current["Profit"], previous["Profit"]) if has_history else None,
+            "orders_delta": percent_change(current["Orders"], previous["Orders"]) if has_history else None,
+            "comparison": mode,
+            "comparison_start": previous_window[0],
+            "comparison_end": previous_window[1],
+        }
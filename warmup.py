@@ -0,0 +1,54 @@
+import threading
+from collections import Counter, deque
+
+import pandas as pd
+
+from analytics import filter_key
+
+# Background cache warming
+#
+# Which selections are worth computing before anyone asks for them: the
+# default one (every date and every value of every dimension) and the filter
+# sets applied most often in recent sessions of this server process.
+# FilterHistory keeps the last HISTORY_SIZE filter sets applied to one dataset
+# by any session; the dashboard records a session's filters whenever they
+# change and hands warm_plan's list to a background job as soon as a dataset
+# is loaded, and again whenever the list changes.
+
+HISTORY_SIZE = 500
+WARM_FILTER_SETS = 3
+
+
+def default_filters(engine):
+    """The filters of a fresh session: the full date range, every value of every dimension."""
+    return {
+        "date_range": (
+            pd.Timestamp(engine.sorted_dates[0]).date(),
+            pd.Timestamp(engine.sorted_dates[-1]).date(),
+        ),
+        "sales_range": None,
+    }
+
+
+class FilterHistory:
+    def __init__(self, size=HISTORY_SIZE):
+        self.recent = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def record(self, filters):
+        with self.lock:
+            self.recent.append((filter_key(filters), dict(filters)))
+
+    def most_common(self, n, exclude=()):
+        """Up to n recent filter sets, most often applied first."""
+        with self.lock:
+            recent = list(self.recent)
+        latest = dict(recent)
+        counts = Counter(key for key, _ in recent)
+        return [latest[key] for key, _ in counts.most_common() if key not in exclude][:n]
+
+
+def warm_plan(engine, history, n=WARM_FILTER_SETS):
+    """Filter sets to precompute for a freshly loaded dataset, default selection first."""
+    default = default_filters(engine)
+    return [default] + history.most_common(n, exclude={filter_key(default)})